@@ -8,6 +8,7 @@ sys.path.insert(0, './scripts/formatted')
 sys.path.insert(0, './scripts/trusted')
 sys.path.insert(0, './scripts/trusted/generic_data_quality')
 sys.path.insert(0, './scripts/exploitation')
+sys.path.insert(0, './scripts/storage')
 sys.path.insert(0, './scripts/analytical_backbone/sandbox')
 sys.path.insert(0, './scripts/analytical_backbone/feature_engineering')
 sys.path.insert(0, './scripts/analytical_backbone/data_augmentation')
@@ -23,16 +24,19 @@ from raw2temporal import raw2temporal # step 2
 from temporal2persistent import temporal2persistent # step 3
 from landing2formatted import landing2formatted # step 4
 from formatted2trusted import formatted2trusted # step 5
+from incremental_trusted import incremental_trusted # steps 5 and 6 on new snapshots only
 from deduplication import deduplication # step 6.deduplication
 from profiling_formatted import spotify_profiling_app
 from profiling_formatted import ticketmaster_profiling_app
 from profiling_formatted import quick_format_prep
 from consistent_formatting import consistent_formatting
 from misspellings import misspellings
+from data_quality_rules import data_quality_rules
 from profiling_trusted import spotify_profiling_app_trusted
 from profiling_trusted import ticketmaster_profiling_app_trusted
 from trusted2exploitation import trusted2exploit
 from trusted2exploitation import add_tables_to_duckdb
+from zone_storage import export_zone
 from profiling_exploitation import profiling_explo_app
 from sandbox import exploitation2sandbox
 from feature_generation import feature_generation
@@ -62,11 +66,12 @@ with tab1:
     artist_file = st.file_uploader("Upload artist names file (.txt)", type="txt", key="tab1b")
     raw_data_path = st.text_input("Path to store the ingested raw data files", "./data/raw", key="tab1c")
     out_filename = st.text_input("Output (.json) file name", "spotify_data.json", key="tab1d")
+    concurrency = st.number_input("Concurrent requests (0 for sequential ingestion)", min_value=0, value=8, key="tab1e")
     
     if st.button("Fetch Spotify Data"):
         if client_id and client_secret and artist_file:
             artist_names = [line.strip() for line in artist_file.read().decode("utf-8").splitlines()]
-            ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename)
+            ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename, concurrency=concurrency or None)
             st.success(f"Spotify data has been saved to {os.path.join(raw_data_path, out_filename)}")
         else:
             st.error("Please enter all required fields.")
@@ -76,11 +81,12 @@ with tab2:
     artist_file_tm = st.file_uploader("Upload artist names file (.txt)", type="txt", key="tab2a")
     raw_data_path_tm = st.text_input("Path to store the ingested raw data files", "./data/raw", key="tab2b")
     out_filename_tm = st.text_input("Output .json file name", "ticketmaster_data.json", key="tab23")
+    concurrency_tm = st.number_input("Concurrent requests (0 for sequential ingestion)", min_value=0, value=8, key="tab24")
     
     if st.button("Fetch TicketMaster Data"):
         if api_key and artist_file_tm:
             artist_names = [line.strip() for line in artist_file_tm.read().decode("utf-8").splitlines()]
-            ingest_ticketmaster_data(api_key, artist_names, raw_data_path_tm, out_filename_tm)
+            ingest_ticketmaster_data(api_key, artist_names, raw_data_path_tm, out_filename_tm, concurrency=concurrency_tm or None)
             st.success(f"Ticketmaster data has been saved to {os.path.join(raw_data_path_tm, out_filename_tm)}")
         else:
             st.error("Please enter all required fields.")
@@ -111,11 +117,12 @@ st.markdown("<h3 style='color: #1f77b4;'>3. Temporal to Persistent Landing</h3>"
 # Input fields for the temporal and persistent directories
 tempdir_in = st.text_input("Input data path (temporal):", "./data/landing/temporal", key="step3a")
 persistdir_out = st.text_input("Output data path (persistent):", "./data/landing/persistent", key="step3b")
+compression = st.selectbox("Storage format", ["JSON", "gzip NDJSON", "zstd NDJSON"], key="step3c")
 
 if st.button("Move Data"):
     if tempdir_in and persistdir_out:
         # Call the temporal2persistent function
-        temporal2persistent(tempdir_in, persistdir_out)
+        temporal2persistent(tempdir_in, persistdir_out, {"JSON": None, "gzip NDJSON": "gzip", "zstd NDJSON": "zstd"}[compression])
         st.success(f"Data has been moved from '{tempdir_in}' to '{persistdir_out}'")
     else:
         st.error("Please provide both paths.")
@@ -127,11 +134,14 @@ st.markdown("<h3 style='color: #1f77b4;'>4. Persistent Landing to Formatted</h3>
 # Input fields for the persistent and formatted directories
 persdir_in = st.text_input("Input data path (persistent):", "./data/landing/persistent", key="step4a")
 formdir_out = st.text_input("Output data path (formatted):", "./data/formatted",key="step4b")
+conversion_engine = st.selectbox("Conversion engine", ["pandas", "duckdb"], key="step4c")
+incremental_conversion = st.checkbox("Only convert new files", value=True, key="step4d")
+conversion_workers = st.number_input("Parallel workers (pandas engine)", min_value=1, value=1, step=1, key="step4e")
 
 if st.button("Convert Data"):
     if persdir_in and formdir_out:
         # Call the landing2formatted function
-        landing2formatted(persdir_in, formdir_out)
+        landing2formatted(persdir_in, formdir_out, conversion_engine, incremental_conversion, int(conversion_workers))
         st.success("Data successfully converted to DuckDB format in the formatted zone.")
     else:
         st.error("Please provide both paths.")
@@ -156,31 +166,41 @@ st.markdown("<h3 style='color: #1f77b4;'>5. Formatted to Trusted</h3>", unsafe_a
 # Input fields for the DuckDB file path and the trusted directory
 duckdb_file_path = st.text_input("Input DuckDB database (formatted):","./data/formatted/formatted.duckdb" , key="step5a")
 trusted_dir = st.text_input("Output data path (trusted):","./data/trusted", key="step5b")
+trusted_engine = st.selectbox("Engine", ["pandas", "sql"], key="step5c")
 
 if st.button("Homogenize and Save Data to Trusted Zone"):
     if duckdb_file_path and trusted_dir:
         # Call the formatted2trusted function
-        formatted2trusted(duckdb_file_path, trusted_dir)
+        formatted2trusted(duckdb_file_path, trusted_dir, trusted_engine)
         st.success("Data successfully homogenized and saved to the trusted zone.")
     else:
         st.error("Please provide both paths.")
 
+if st.button("Append New Snapshots (with data quality)"):
+    if duckdb_file_path and trusted_dir:
+        # Call the incremental_trusted function (formatted2trusted and the data quality steps on the new snapshots only)
+        incremental_trusted(duckdb_file_path, trusted_dir)
+        st.success("New snapshots cleaned and appended to the trusted zone.")
+    else:
+        st.error("Please provide both paths.")
+
 ####### Step 6: Data Quality (trusted zone) #######
 
 st.markdown("<h3 style='color: #1f77b4;'>6. Data Quality (trusted zone)</h3>", unsafe_allow_html=True)
 
-tab1, tab2, tab3 = st.tabs(["Deduplication", "Consistent formatting", "Misspellings"])
+tab1, tab2, tab3, tab4 = st.tabs(["Deduplication", "Consistent formatting", "Misspellings", "All rules (SQL)"])
 
 # Deduplication Tab
 with tab1:    
     # Input field for the DuckDB database file path
     db_file_path = st.text_input("Input DuckDB database (trusted):","./data/trusted/trusted.duckdb" , key="dedup")
+    dedup_engine = st.selectbox("Engine", ["pandas", "sql"], key="dedup_engine")
     # Button for deduplication
     if st.button("Run Deduplication"):
         if db_file_path:
             try:
                 # deduplication function
-                output_messages = deduplication(db_file_path)
+                output_messages = deduplication(db_file_path, engine=dedup_engine)
                 st.success("Deduplication process completed successfully.")
                 for message in output_messages: # print each message
                     st.write(message)
@@ -193,12 +213,13 @@ with tab1:
 with tab2:    
     # Input field for the DuckDB database file path
     db_file_path = st.text_input("Input DuckDB database (trusted):","./data/trusted/trusted.duckdb" , key="cons_format")
+    format_engine = st.selectbox("Engine", ["pandas", "vectorized"], key="format_engine")
     # Button for deduplication
     if st.button("Run formatting"):
         if db_file_path:
             try:
                 # consistent formatting function
-                consistent_formatting(db_file_path)
+                consistent_formatting(db_file_path, engine=format_engine)
                 st.success("Consistent formatting process completed successfully.")
             except Exception as e:
                 st.error(f"An error occurred during consistent formatting: {e}")
@@ -209,18 +230,38 @@ with tab2:
 with tab3:    
     # Input field for the DuckDB database file path
     db_file_path = st.text_input("Input DuckDB database (trusted):","./data/trusted/trusted.duckdb" , key="misspel")
+    misspellings_engine = st.selectbox("Engine", ["pandas", "sql"], key="misspel_engine")
     # Button for deduplication
     if st.button("Run misspellings"):
         if db_file_path:
             try:
                 # consistent formatting function
-                misspellings(db_file_path)
+                misspellings(db_file_path, engine=misspellings_engine)
                 st.success("Consistent formatting process completed successfully.")
             except Exception as e:
                 st.error(f"An error occurred during consistent formatting: {e}")
         else:
             st.error("Please provide a valid DuckDB file path.")
 
+# Data quality rules Tab
+with tab4:
+    # Input field for the DuckDB database file path
+    db_file_path = st.text_input("Input DuckDB database (trusted):","./data/trusted/trusted.duckdb" , key="dq_rules")
+    profile_rules = st.checkbox("Report the time and rows of each rule", key="dq_rules_profile")
+    # Button for the data quality rules
+    if st.button("Run all data quality rules"):
+        if db_file_path:
+            try:
+                # deduplication, consistent formatting and misspellings in one query per table
+                output_messages = data_quality_rules(db_file_path, profile=profile_rules)
+                st.success("Data quality rules applied successfully.")
+                for message in output_messages: # print each message
+                    st.write(message)
+            except Exception as e:
+                st.error(f"An error occurred while applying the data quality rules: {e}")
+        else:
+            st.error("Please provide a valid DuckDB file path.")
+
 ####### PROFILING TRUSTED ########
 
 st.markdown("<h4 style='color: #1f77b4;'> PROFILING - Trusted Zone</h4>", unsafe_allow_html=True)
@@ -240,14 +281,25 @@ st.markdown("<h3 style='color: #1f77b4;'>7. Trusted to Exploitation</h3>", unsaf
 # Input fields for the DuckDB file path and the trusted directory
 duckdb_file_path = st.text_input("Input DuckDB database (trusted):","./data/trusted/trusted.duckdb" , key="step7a")
 exploit_dir = st.text_input("Output data path (exploitation):","./data/exploitation", key="step7b")
+storage_backend = st.selectbox("Zone storage", ["DuckDB", "Parquet"], key="step7c")
 
 if st.button("Pass from Trusted Exploitation Zone"):
     if duckdb_file_path and trusted_dir:
+        trusted_zone = duckdb_file_path
+        if storage_backend == "Parquet":
+            # Export the trusted zone to Parquet datasets and build the exploitation zone by scanning them (see zone_storage.py)
+            trusted_zone = os.path.join(os.path.dirname(duckdb_file_path), 'parquet')
+            export_zone(duckdb_file_path, trusted_zone)
         # Call the formatted2trusted function
-        trusted2exploit(duckdb_file_path, exploit_dir)
+        trusted2exploit(trusted_zone, exploit_dir)
         exploit_duckdb_path = os.path.join(exploit_dir, 'exploitation.duckdb')
         add_tables_to_duckdb(exploit_duckdb_path)
-        st.success("Exploitation zone database successfully created.")
+        if storage_backend == "Parquet":
+            # The sandbox step can read the exploitation zone from this directory
+            export_zone(exploit_duckdb_path, os.path.join(exploit_dir, 'parquet'))
+            st.success(f"Exploitation zone successfully created (Parquet zone: {os.path.join(exploit_dir, 'parquet')}).")
+        else:
+            st.success("Exploitation zone database successfully created.")
     else:
         st.error("Please provide both paths.")
 
@@ -271,7 +323,7 @@ st.markdown("<h1 style='color: #155a8a;'>Analytical Backbone</h1>", unsafe_allow
 st.markdown("<h3 style='color: #1f77b4;'>8. Exploitation to Sandbox</h3>", unsafe_allow_html=True)
 
 # Input fields for the DuckDB file path and the trusted directory
-duckdb_file_path = st.text_input("Input DuckDB database (exploitation):","./data/exploitation/exploitation.duckdb" , key="step8a")
+duckdb_file_path = st.text_input("Input DuckDB database or Parquet zone (exploitation):","./data/exploitation/exploitation.duckdb" , key="step8a")
 sandbox_dir = st.text_input("Output data path (sandbox):","./data/analytical_backbone/sandbox", key="step8b")
 
 if st.button("Pass from Exploitation Zone to the Sandbox"):
@@ -2,14 +2,19 @@
 
 import duckdb
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'storage'))
+from zone_storage import connect_zone
 
 def exploitation2sandbox(duckdb_file_path, sandbox_dir):
     """
     Function to select a subset from the exploitation zone to analyze further
     down the analytical backbone
+    (`duckdb_file_path` can also be an exploitation Parquet zone directory, see zone_storage.py)
     """
     # Connect to the DuckDB database
-    conn = duckdb.connect(duckdb_file_path)
+    conn = connect_zone(duckdb_file_path, read_only=False)
 
     sandbox_df = conn.execute("SELECT a.artist, st.popularity, st.followers, a.genres, p.avg_min_price, p.avg_max_price FROM artists_stats st, artists a, avg_price p WHERE st.artist = a.artist AND a.artist = p.artist").df()
 
@@ -0,0 +1,69 @@
+import os
+import duckdb
+import pandas as pd
+
+"""# Spotify artist ID cache
+Persistent mapping from the artist names we search for to their Spotify artist IDs, stored in a DuckDB database
+next to the raw zone. Since this mapping almost never changes between ingestions, recurring ingestions only need
+to search the new artists, and can refresh the rest in batches of IDs.
+"""
+
+def default_cache_path(raw_data_path):
+    """ Cache location for a raw data directory: a DuckDB file in its parent directory (e.g. ./data/spotify_artist_ids.duckdb).
+    It is kept out of the raw directory itself so that raw2temporal does not land it with the data files.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(raw_data_path))
+    return os.path.join(parent_dir, 'spotify_artist_ids.duckdb')
+
+def connect_cache(cache_path):
+    """ Open the cache database, creating the artist_ids table if needed.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    con = duckdb.connect(database=cache_path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS artist_ids (
+            artist_name VARCHAR PRIMARY KEY,
+            spotify_id VARCHAR NOT NULL,
+            updated_at TIMESTAMP DEFAULT current_timestamp
+        )
+    """)
+    return con
+
+def load_artist_ids(cache_path, artist_names):
+    """ Return a {artist name: Spotify ID} dictionary with the cached IDs of `artist_names`.
+    """
+    if not os.path.exists(cache_path):
+        return {}
+    con = connect_cache(cache_path)
+    wanted = pd.DataFrame({'artist_name': list(set(artist_names))}, dtype=object)
+    con.register('wanted', wanted)
+    rows = con.execute("SELECT c.artist_name, c.spotify_id FROM artist_ids c JOIN wanted w USING (artist_name)").fetchall()
+    con.close()
+    return dict(rows)
+
+def save_artist_ids(cache_path, artist_ids):
+    """ Store (or update) the {artist name: Spotify ID} pairs in the cache.
+    """
+    if not artist_ids:
+        return
+    con = connect_cache(cache_path)
+    new_ids = pd.DataFrame(list(artist_ids.items()), columns=['artist_name', 'spotify_id'], dtype=object)
+    con.register('new_ids', new_ids)
+    con.execute("""
+        INSERT INTO artist_ids (artist_name, spotify_id) SELECT artist_name, spotify_id FROM new_ids
+        ON CONFLICT (artist_name) DO UPDATE SET spotify_id = excluded.spotify_id, updated_at = now()
+    """)
+    con.close()
+
+def forget_artist_ids(cache_path, artist_names):
+    """ Remove artists from the cache (e.g. when their Spotify ID is no longer valid).
+    """
+    if not artist_names or not os.path.exists(cache_path):
+        return
+    con = connect_cache(cache_path)
+    forgotten = pd.DataFrame({'artist_name': list(artist_names)}, dtype=object)
+    con.register('forgotten', forgotten)
+    con.execute("DELETE FROM artist_ids WHERE artist_name IN (SELECT artist_name FROM forgotten)")
+    con.close()
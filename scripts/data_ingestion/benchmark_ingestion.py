@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import aiohttp
+
+import fixture_server
+import http_client
+import spotify_data_ingestion
+import ticketmaster_data_ingestion
+
+"""# Ingestion benchmark
+Run the Spotify and Ticketmaster ingestion modes (sequential, and asynchronous for every concurrency level)
+against the local fixture server (see fixture_server.py), so no real API calls are made, and report the
+throughput (artists/s) and the request latency percentiles (p50 / p95 / p99) of each mode.
+
+Usage (from the repository root):
+    python ./scripts/data_ingestion/benchmark_ingestion.py --latency 0.05 --concurrency 1,4,16 --throttle-rate 0.01
+"""
+
+class LatencyRecorder:
+    """ Collect the latency of every HTTP request made by the ingestion, synchronous (requests session hook)
+    or asynchronous (aiohttp trace config).
+    """
+    def __init__(self):
+        self.latencies = []
+        http_client.get_session().hooks['response'].append(self._on_response)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        http_client.ASYNC_TRACE_CONFIGS.append(trace_config)
+
+    def _on_response(self, response, *args, **kwargs):
+        self.latencies.append(response.elapsed.total_seconds())
+
+    async def _on_request_start(self, session, context, params):
+        context.start = time.perf_counter()
+
+    async def _on_request_end(self, session, context, params):
+        self.latencies.append(time.perf_counter() - context.start)
+
+    def reset(self):
+        self.latencies = []
+
+    def percentiles(self):
+        """ p50, p95 and p99 of the recorded latencies, in milliseconds.
+        """
+        if not self.latencies:
+            return [float('nan')] * 3
+        cuts = statistics.quantiles(self.latencies * 2, n=100)  # Doubled: quantiles needs at least two values
+        return [cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000]
+
+def run_mode(recorder, ingest, out_dir, out_filename):
+    """ Run one ingestion mode. Returns the elapsed time, the number of requests, the latency percentiles and the records.
+    """
+    recorder.reset()
+    start = time.perf_counter()
+    ingest(out_dir, out_filename)
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(out_dir, out_filename)) as json_file:
+        records = json.load(json_file)
+    return elapsed, len(recorder.latencies), recorder.percentiles(), records
+
+def benchmark_ingestion(artist_names, concurrency_levels, rate_limit, **fault_settings):
+    server, base_url = fixture_server.start_fixture_server(**fault_settings)
+    fixture_server.point_ingestion_to(base_url)
+    recorder = LatencyRecorder()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        checkpoint_dir = os.path.join(out_dir, 'checkpoints')
+
+        def spotify(concurrency, cache_path=None):
+            return lambda path, filename: spotify_data_ingestion.ingest_spotify_data(
+                'fixture-id', 'fixture-secret', artist_names, path, filename, concurrency=concurrency, rate_limit=rate_limit,
+                use_cache=cache_path is not None, cache_path=cache_path, checkpoint_dir=checkpoint_dir)
+
+        def ticketmaster(concurrency):
+            return lambda path, filename: ticketmaster_data_ingestion.ingest_ticketmaster_data(
+                'fixture-key', artist_names, path, filename, concurrency=concurrency, rate_limit=rate_limit,
+                checkpoint_dir=checkpoint_dir)
+
+        modes = [('Spotify', 'sequential', spotify(None)), ('Ticketmaster', 'sequential', ticketmaster(None))]
+        for concurrency in concurrency_levels:
+            modes.append(('Spotify', f"async x{concurrency}", spotify(concurrency)))
+        # The warm cache mode refreshes the artists by ID (batches of 50) instead of searching them one by one
+        cache_path = os.path.join(out_dir, 'spotify_artist_ids.duckdb')
+        spotify(max(concurrency_levels), cache_path)(out_dir, 'cache_fill.json')
+        modes.append(('Spotify', f"async x{max(concurrency_levels)} (warm cache)", spotify(max(concurrency_levels), cache_path)))
+        for concurrency in concurrency_levels:
+            modes.append(('Ticketmaster', f"async x{concurrency}", ticketmaster(concurrency)))
+
+        for i, (source, mode, ingest) in enumerate(modes):
+            results[(source, mode)] = run_mode(recorder, ingest, out_dir, f"{source.lower()}_{i}.json")
+
+    server.shutdown()
+
+    print(f"\n{len(artist_names)} artists | fixture server: {fault_settings} | rate limit: {rate_limit} req/s")
+    print(f"{'Source':<13} {'Mode':<26} {'Time (s)':>9} {'Artists/s':>10} {'Requests':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for (source, mode), (elapsed, n_requests, (p50, p95, p99), _) in results.items():
+        print(f"{source:<13} {mode:<26} {elapsed:>9.2f} {len(artist_names) / elapsed:>10.1f} {n_requests:>9} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+
+    for source in ['Spotify', 'Ticketmaster']:
+        outputs = [records for (s, _), (_, _, _, records) in results.items() if s == source]
+        print(f"{source}: {len(outputs[0])} records, same output in every mode: {all(records == outputs[0] for records in outputs)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion modes against the local fixture server.")
+    parser.add_argument('--artist-names', default='./data/artist_names_subset.txt', help="File with the artist names to ingest")
+    parser.add_argument('--n-artists', type=int, default=100, help="Number of artists ingested by every mode")
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma separated concurrency levels of the async mode")
+    parser.add_argument('--rate-limit', type=float, default=100, help="Requests per second allowed to every mode")
+    parser.add_argument('--raw-dir', default='./data/raw', help="Directory with the raw files replayed by the fixture server")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency (uniform between 0 and jitter seconds)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After (seconds) sent with HTTP 429")
+    parser.add_argument('--quota', type=float, default=None, help="Requests per second accepted before answering HTTP 429")
+    args = parser.parse_args()
+
+    with open(args.artist_names) as file:
+        artist_names = [line.strip() for line in file][:args.n_artists]
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+
+    benchmark_ingestion(artist_names, concurrency_levels, args.rate_limit, raw_dir=args.raw_dir, artist_names_file=args.artist_names,
+                        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        throttle_rate=args.throttle_rate, retry_after=args.retry_after, quota=args.quota)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import time
+
+"""# Ingestion checkpoints
+Records are appended to an NDJSON file as soon as each artist is completed, together with a cursor
+of the completed artists. If an ingestion run dies, running it again with the same output file name
+skips the artists already completed. The final JSON file is produced by a finalize step that copies
+the NDJSON lines, without re-serializing the records.
+
+Only successful fetches are checkpointed: an artist whose request failed is recorded as failed, and the checkpoint
+is kept after the finalize step, so running the ingestion again with the same output file name retries only the
+failed artists (and writes the complete file).
+
+A checkpoint belongs to one run: it records the hash of the artist list it was started with and its creation time.
+It is discarded, instead of resumed, by a run with another artist list (e.g. a later ingestion with the same default
+output file name) or once it is older than `max_age` seconds, so stale records never end up in a new raw file.
+"""
+
+# Age (seconds) after which a checkpoint is discarded instead of resumed
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+def default_checkpoint_dir(raw_data_path):
+    """ Checkpoint location for a raw data directory: a 'checkpoints' directory next to it (e.g. ./data/checkpoints).
+    It is kept out of the raw directory itself so that raw2temporal does not land partial files.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(raw_data_path)), 'checkpoints')
+
+def artists_key(artist_names):
+    """ Hash identifying the artist list of a run.
+    """
+    return hashlib.sha256(json.dumps(list(artist_names)).encode()).hexdigest()
+
+class IngestionCheckpoint:
+    """ Checkpoint of one ingestion run (identified by its output file name and its artist list), made of:
+
+    - <out_filename>.run: the hash of the artist list and the creation time of the checkpoint.
+    - <out_filename>.ndjson: one JSON record per line.
+    - <out_filename>.cursor: one line per completed artist, with the byte offsets of its records in the NDJSON file.
+    """
+    def __init__(self, checkpoint_dir, out_filename, artist_names, max_age=CHECKPOINT_MAX_AGE):
+        if not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        self.run_path = os.path.join(checkpoint_dir, f"{out_filename}.run")
+        self.records_path = os.path.join(checkpoint_dir, f"{out_filename}.ndjson")
+        self.cursor_path = os.path.join(checkpoint_dir, f"{out_filename}.cursor")
+
+        # A checkpoint of another run (other artists, too old, or written before the run file existed) is discarded
+        key = artists_key(artist_names)
+        run = self._read_run()
+        if run is None or run.get('artists') != key or time.time() - run.get('created_at', 0) > max_age:
+            if os.path.exists(self.cursor_path):
+                print(f"Discarding the stale checkpoint of {out_filename} (another artist list, or older than {max_age} seconds)")
+            self._remove_files()
+            with open(self.run_path, 'w') as run_file:
+                json.dump({'artists': key, 'created_at': time.time()}, run_file)
+
+        # Artist name -> (start, end) byte offsets of its records
+        self.completed = {}
+        # Artist name -> error of the artists that could not be fetched in this run
+        self.failed = {}
+        offset = 0  # End of the records of the completed artists
+        cursor_size = 0  # End of the last complete cursor line
+        if os.path.exists(self.cursor_path):
+            with open(self.cursor_path, 'rb') as cursor_file:
+                for line in cursor_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Line partially written when the previous run died
+                    if not line.endswith(b'\n'):
+                        break
+                    self.completed[entry['artist']] = (entry['start'], entry['end'])
+                    offset = max(offset, entry['end'])
+                    cursor_size += len(line)
+            if self.completed:
+                print(f"Resuming ingestion: {len(self.completed)} artists already completed")
+
+        # Discard anything written after the last completed artist (e.g. records whose cursor line was never written)
+        self.records_file = open(self.records_path, 'a+b')
+        self.records_file.truncate(offset)
+        self.records_file.seek(offset)
+        self.cursor_file = open(self.cursor_path, 'a+b')
+        self.cursor_file.truncate(cursor_size)
+
+    def _read_run(self):
+        try:
+            with open(self.run_path) as run_file:
+                return json.load(run_file)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_files(self):
+        for path in (self.records_path, self.cursor_path, self.run_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def is_completed(self, artist_name):
+        return artist_name in self.completed
+
+    def write(self, artist_name, records):
+        """ Append the records of an artist and mark it as completed.
+        """
+        start = self.records_file.tell()
+        for record in records:
+            self.records_file.write(json.dumps(record).encode() + b'\n')
+        self.records_file.flush()
+        end = self.records_file.tell()
+
+        # The cursor is written after the records: an artist is only completed once all its records are on disk
+        self.cursor_file.write(json.dumps({'artist': artist_name, 'start': start, 'end': end}).encode() + b'\n')
+        self.cursor_file.flush()
+        self.completed[artist_name] = (start, end)
+        self.failed.pop(artist_name, None)
+
+    def fail(self, artist_name, error):
+        """ Record an artist that could not be fetched: it is not completed, so the next run fetches it again.
+        """
+        self.failed[artist_name] = error
+        print(f"{time.time()}: artist \"{artist_name}\" not fetched: {error}")
+
+    def finalize(self, output_path, artist_names):
+        """ Write the final JSON file (a list of records, grouped by artist in the order of `artist_names`)
+        by copying the NDJSON lines, and remove the checkpoint files (unless some artists failed).
+        """
+        self.cursor_file.close()
+        self.records_file.flush()
+
+        # Written next to the output and renamed over it: an existing file is replaced, never left half written
+        n_records = 0
+        with open(output_path + '.tmp', 'wb') as json_file:
+            json_file.write(b'[\n')
+            for artist_name in artist_names:
+                if artist_name not in self.completed:
+                    continue
+                start, end = self.completed[artist_name]
+                self.records_file.seek(start)
+                for line in self.records_file.read(end - start).splitlines():
+                    json_file.write((b',\n' if n_records else b'') + line)
+                    n_records += 1
+            json_file.write(b'\n]\n')
+        os.replace(output_path + '.tmp', output_path)
+
+        self.records_file.close()
+        if self.failed:
+            print(f"{len(self.failed)} artists could not be fetched: run the ingestion again with the same output file "
+                  f"name to retry them (checkpoint kept in {os.path.dirname(self.records_path)})")
+            return n_records
+        self._remove_files()
+        return n_records
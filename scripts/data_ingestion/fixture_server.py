@@ -0,0 +1,245 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+"""# Fixture server
+Local stand-in for the Spotify and Ticketmaster APIs that replays the responses recorded in the raw zone
+(the most recent data/raw/*.json file of each source), so the ingestion scripts can be benchmarked and load-tested offline.
+
+The server answers the endpoints used by the ingestion (Spotify token, search and several artists;
+Ticketmaster paginated events search) and can simulate an unhealthy API:
+- latency / jitter: seconds added to every response (latency + uniform(0, jitter)).
+- error_rate: fraction of requests answered with HTTP 503.
+- throttle_rate: fraction of requests answered with HTTP 429 and a `Retry-After` header.
+- quota: requests per second accepted before answering HTTP 429 (like a real API quota).
+
+Usage (from the repository root):
+    python ./scripts/data_ingestion/fixture_server.py --port 8000 --latency 0.05 --throttle-rate 0.01
+"""
+
+def spotify_id(name):
+    """ Stable fake Spotify ID of an artist.
+    """
+    return hashlib.md5(name.encode()).hexdigest()[:22]
+
+def spotify_artist_object(record):
+    """ Rebuild the Spotify artist object from a raw Spotify record.
+    """
+    return {
+        'id': spotify_id(record['artist']),
+        'name': record['artist'],
+        'genres': record['genres'],
+        'followers': {'total': record['followers']},
+        'popularity': record['popularity']
+    }
+
+def ticketmaster_event_object(record):
+    """ Rebuild the Ticketmaster event object from a raw Ticketmaster record (the inverse of extract_event_info).
+    """
+    event = {'name': record['name'], 'dates': {'start': {}}}
+    if record['date'] != 'N/A':
+        event['dates']['start']['localDate'] = record['date']
+    if record['time'] != 'N/A':
+        event['dates']['start']['localTime'] = record['time']
+
+    city, _, country = record['location'].rpartition(', ')
+    venue = {}
+    if record['venue'] != 'N/A':
+        venue['name'] = record['venue']
+    if city != 'N/A':
+        venue['city'] = {'name': city}
+    if country != 'N/A':
+        venue['country'] = {'name': country}
+    event['_embedded'] = {'venues': [venue]}
+
+    if record['price_range'] != 'N/A':
+        prices, currency = record['price_range'].rsplit(' ', 1)
+        price_range = {'currency': currency} if currency != 'N/A' else {}
+        for key, price in zip(['min', 'max'], prices.split('-', 1)):
+            if price != 'N/A':
+                price_range[key] = float(price)
+        event['priceRanges'] = [price_range]
+    return event
+
+def load_recordings(raw_dir, artist_names_file=None):
+    """ Load the most recent raw Spotify and Ticketmaster files of `raw_dir` (by file name).
+
+    Returns the Spotify artists indexed by searched name and the Ticketmaster events indexed by artist.
+    Spotify records store the name returned by the API, which can differ from the searched one ('Pink' -> 'Pink Floyd');
+    if `artist_names_file` is the list of names that produced the Spotify file (one record per name, in order),
+    the artists can also be found by the searched names.
+    """
+    def latest(source):
+        paths = sorted(path for path in glob.glob(os.path.join(raw_dir, '*.json')) if source in os.path.basename(path).lower())
+        if not paths:
+            return []
+        with open(paths[-1]) as json_file:
+            return json.load(json_file)
+
+    spotify_records = latest('spotify')
+    artists = {record['artist'].lower(): spotify_artist_object(record) for record in spotify_records}
+    if artist_names_file is not None and os.path.exists(artist_names_file):
+        with open(artist_names_file) as file:
+            artist_names = [line.strip() for line in file]
+        if len(artist_names) == len(spotify_records):
+            for name, record in zip(artist_names, spotify_records):
+                artists.setdefault(name.lower(), spotify_artist_object(record))
+
+    events = {}
+    for record in latest('ticketmaster'):
+        events.setdefault(record['artist'], []).append(ticketmaster_event_object(record))
+    return artists, events
+
+class FaultInjector:
+    """ Decide, for every request, whether the fixture server answers normally, throttles it or fails it.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1, quota=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.quota = quota
+        self.random = random.Random(seed)
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def fault(self):
+        """ Return None for a normal answer, or the (status, headers) of the injected fault.
+        """
+        with self._lock:
+            if self.quota is not None:
+                now = time.monotonic()
+                if now - self.window_start >= 1.0:  # One second fixed window, as the quota is expressed per second
+                    self.window_start, self.window_count = now, 0
+                self.window_count += 1
+                if self.window_count > self.quota:
+                    return 429, {'Retry-After': str(self.retry_after)}
+            draw = self.random.random()
+        if draw < self.throttle_rate:
+            return 429, {'Retry-After': str(self.retry_after)}
+        if draw < self.throttle_rate + self.error_rate:
+            return 503, {}
+        return None
+
+def make_fixture_handler(artists, events, faults):
+    """ Build the request handler replaying `artists` (lowercase name -> Spotify artist object) and `events` (artist -> Ticketmaster events).
+    """
+    artists_by_id = {artist['id']: artist for artist in artists.values()}
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real APIs
+
+        def _send_json(self, payload, status=200, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self._send_json({'access_token': 'fixture-token', 'token_type': 'Bearer', 'expires_in': 3600})
+
+        def do_GET(self):
+            time.sleep(faults.delay())
+            fault = faults.fault()
+            if fault is not None:
+                status, headers = fault
+                self._send_json({'error': {'status': status}}, status=status, headers=headers)
+                return
+
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            if url.path.endswith('/search'):
+                artist = artists.get(query.get('q', '').lower())
+                self._send_json({'artists': {'items': [artist] if artist is not None else []}})
+            elif url.path.endswith('/artists'):
+                ids = query.get('ids', '').split(',')
+                self._send_json({'artists': [artists_by_id.get(i) for i in ids]})
+            elif url.path.endswith('/events.json'):
+                self._send_events(query)
+            else:
+                self._send_json({'error': {'status': 404}}, status=404)
+
+        def _send_events(self, query):
+            size, page = int(query.get('size', 20)), int(query.get('page', 0))
+            if size * page >= 1000:  # Deep paging limit of the Discovery API
+                self._send_json({'errors': [{'code': 'DIS1035'}]}, status=400)
+                return
+            artist_events = events.get(query.get('keyword', ''), [])
+            payload = {'page': {'size': size, 'totalElements': len(artist_events),
+                                'totalPages': -(-len(artist_events) // size), 'number': page}}
+            page_events = artist_events[page * size:(page + 1) * size]
+            if page_events:
+                payload['_embedded'] = {'events': page_events}
+            self._send_json(payload)
+
+        def log_message(self, format, *args):
+            pass  # Keep the output clean
+
+    return FixtureHandler
+
+class FixtureServer(ThreadingHTTPServer):
+    request_queue_size = 128  # The default backlog (5) drops connections when many workers connect at once
+    daemon_threads = True
+
+def start_fixture_server(raw_dir='./data/raw', port=0, artist_names_file='./data/artist_names_subset.txt', **fault_settings):
+    """ Start the fixture server in a background thread. Returns the server and its base URL.
+    See load_recordings for the replayed data and FaultInjector for the fault settings
+    (latency, jitter, error_rate, throttle_rate, retry_after, quota, seed).
+    """
+    artists, events = load_recordings(raw_dir, artist_names_file)
+    handler = make_fixture_handler(artists, events, FaultInjector(**fault_settings))
+    server = FixtureServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def point_ingestion_to(base_url):
+    """ Make the ingestion scripts send their requests to the fixture server at `base_url`.
+    """
+    import spotify_data_ingestion
+    import ticketmaster_data_ingestion
+    spotify_data_ingestion.SPOTIFY_TOKEN_URL = f"{base_url}/api/token"
+    spotify_data_ingestion.SPOTIFY_API_URL = f"{base_url}/v1"
+    ticketmaster_data_ingestion.TICKETMASTER_API_URL = f"{base_url}/discovery/v2"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the raw Spotify and Ticketmaster data as a local API.")
+    parser.add_argument('--raw-dir', default='./data/raw', help="Directory with the raw files to replay")
+    parser.add_argument('--artist-names', default='./data/artist_names_subset.txt', help="Artist names searched to produce the raw Spotify file")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Extra random latency (uniform between 0 and jitter seconds)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After (seconds) sent with HTTP 429")
+    parser.add_argument('--quota', type=float, default=None, help="Requests per second accepted before answering HTTP 429")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(args.raw_dir, args.port, args.artist_names, latency=args.latency, jitter=args.jitter,
+                                            error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                                            retry_after=args.retry_after, quota=args.quota)
+    print(f"Spotify token endpoint: {base_url}/api/token")
+    print(f"Spotify API: {base_url}/v1")
+    print(f"Ticketmaster API: {base_url}/discovery/v2")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
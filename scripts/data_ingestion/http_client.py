@@ -0,0 +1,87 @@
+import base64
+import threading
+import time
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+"""# HTTP client
+Pooled HTTP sessions and Spotify access token cache shared by the ingestion scripts. Connections are kept alive
+between requests (no new TCP/TLS handshake per call) and the client-credentials token is only requested again
+shortly before it expires.
+"""
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session(pool_maxsize=32):
+    """ Shared requests session with a keep-alive connection pool, used by all the synchronous API calls.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+# aiohttp.TraceConfig objects attached to every asynchronous session (e.g. to measure request latencies)
+ASYNC_TRACE_CONFIGS = []
+
+def create_async_session(concurrency):
+    """ aiohttp session for one asynchronous ingestion run: at most `concurrency` connections, kept alive between requests.
+    """
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, trace_configs=list(ASYNC_TRACE_CONFIGS))
+
+class SpotifyToken:
+    """ Spotify client-credentials access token, refreshed `refresh_margin` seconds before it expires.
+    """
+    def __init__(self, client_id, client_secret, token_url, refresh_margin=60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.refresh_margin = refresh_margin
+        self.access_token = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _request_token(self):
+        auth_str = f"{self.client_id}:{self.client_secret}"
+        b64_auth_str = base64.b64encode(auth_str.encode()).decode()
+        headers = {
+            "Authorization": f"Basic {b64_auth_str}"
+        }
+        data = {
+            "grant_type": "client_credentials"
+        }
+        response = get_session().post(self.token_url, headers=headers, data=data)
+        token = response.json()
+        self.access_token = token['access_token']
+        self.expires_at = time.monotonic() + token.get('expires_in', 3600)
+
+    def headers(self):
+        """ Authorization headers with a valid access token (requesting a new one if it is about to expire).
+        """
+        with self._lock:
+            if self.access_token is None or time.monotonic() >= self.expires_at - self.refresh_margin:
+                self._request_token()
+            return {"Authorization": f"Bearer {self.access_token}"}
+
+    def invalidate(self):
+        """ Force a new token on the next request (e.g. after an HTTP 401 response).
+        """
+        with self._lock:
+            self.access_token = None
+
+_tokens = {}
+
+def get_spotify_token(client_id, client_secret, token_url):
+    """ Cached token of a Spotify client: every call with the same credentials shares the same token.
+    """
+    with _session_lock:
+        key = (client_id, client_secret, token_url)
+        if key not in _tokens:
+            _tokens[key] = SpotifyToken(client_id, client_secret, token_url)
+        return _tokens[key]
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import random
+import time
+import aiohttp
+import requests
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+"""# Rate limiting
+Adaptive token bucket used to pace the requests sent to the Spotify and Ticketmaster APIs,
+so that the ingestion throughput is bounded by the API quota instead of a fixed sleep.
+Throttled (HTTP 429) and failed (HTTP 5xx) requests are retried after the delay requested
+by the API in the `Retry-After` header, or after an exponential backoff if there is none.
+"""
+
+# Quota settings of each source
+# - rate: requests per second allowed by the API
+# - burst: requests that can be sent back to back
+# - max_retries: retries of a throttled or failed request before giving up on it
+SOURCE_QUOTAS = {
+    'spotify': {'rate': 10, 'burst': 10, 'max_retries': 5},  # Spotify uses a rolling 30 seconds window
+    'ticketmaster': {'rate': 5, 'burst': 5, 'max_retries': 5},  # Discovery API: 5 requests per second
+}
+
+def parse_retry_after(value):
+    """ Function that converts a `Retry-After` header (seconds or HTTP date) into seconds to wait, or None if it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(headers, attempt, base=0.5, cap=60):
+    """ Seconds to wait before retrying a request: `Retry-After` if the API sent it, exponential backoff with jitter otherwise.
+    """
+    retry_after = parse_retry_after(headers.get('Retry-After'))
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+class RateLimiter:
+    """ Token bucket whose refill rate adapts to the API responses.
+
+    - rate: requests per second allowed when the API is healthy (the quota).
+    - burst: maximum number of requests that can be sent back to back (defaults to one second of quota).
+    - min_rate: lower bound for the refill rate after repeated throttling.
+    - max_retries: retries of a throttled or failed request before giving up on it.
+
+    The refill rate grows additively after every successful request (up to `rate`) and is halved
+    every time the API answers with a throttling response (HTTP 429). The same limiter can be shared
+    by threads (acquire) and by coroutines of one event loop (acquire_async).
+    """
+    def __init__(self, rate, burst=None, min_rate=0.5, max_retries=5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.max_retries = max_retries
+        self.increase = self.max_rate / 20  # Recover the full rate after ~20 successful requests
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0  # No request is sent before this instant (set by Retry-After / backoff)
+        self.last_throttle = float('-inf')
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_source(cls, source, **overrides):
+        """ Create the limiter of a source ('spotify' or 'ticketmaster') from SOURCE_QUOTAS, optionally overriding some settings.
+        """
+        settings = dict(SOURCE_QUOTAS[source])
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        if overrides.get('rate') is not None and overrides.get('burst') is None:
+            settings['burst'] = None  # Burst of one second of the overridden rate
+        return cls(**settings)
+
+    def _reserve(self):
+        """ Take a token from the bucket and return how many seconds the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1  # The bucket can go into debt: later callers queue behind this reservation
+            delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(delay, self.resume_at - now)
+
+    def acquire(self):
+        """ Block until a request can be sent.
+        """
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """ Wait (without blocking the event loop) until a request can be sent.
+        """
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_success(self):
+        """ Additive increase of the refill rate after a successful request.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, delay=0.0):
+        """ Multiplicative decrease of the refill rate after a throttling response, pausing all requests for `delay` seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            # Requests in flight are throttled together: decrease the rate at most once per second
+            if now - self.last_throttle >= 1.0:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.last_throttle = now
+        self.pause(delay)
+
+    def pause(self, delay):
+        """ Hold every request (of every worker) for `delay` seconds.
+        """
+        with self._lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+class FetchError(Exception):
+    """ A request that could not be completed: unsuccessful status, or no answer after all the retries.
+    """
+
+def is_retryable(status):
+    """ Throttled (429) and server-side (5xx) errors are worth retrying.
+    """
+    return status == 429 or status >= 500
+
+def request_with_backoff(limiter, send):
+    """ Send a request through `send()` (a function returning a requests.Response) paced by `limiter`,
+    retrying throttled and failed requests. Returns the last response, or None if the request could not be sent.
+    """
+    response = None
+    for attempt in range(limiter.max_retries + 1):
+        limiter.acquire()
+        try:
+            response = send()
+        except requests.ConnectionError:
+            limiter.pause(backoff_delay({}, attempt))
+            continue
+        if response.status_code == 429:
+            limiter.on_throttle(backoff_delay(response.headers, attempt))
+        elif is_retryable(response.status_code):
+            limiter.pause(backoff_delay(response.headers, attempt))
+        else:
+            limiter.on_success()
+            return response
+    return response
+
+async def request_with_backoff_async(limiter, session, url, **kwargs):
+    """ Asynchronous version of request_with_backoff for an aiohttp session (GET requests).
+    Returns a (status, JSON payload) tuple; the payload is None if the request was unsuccessful.
+    """
+    status = None
+    for attempt in range(limiter.max_retries + 1):
+        await limiter.acquire_async()
+        try:
+            async with session.get(url, **kwargs) as response:
+                status = response.status
+                if status == 429:
+                    limiter.on_throttle(backoff_delay(response.headers, attempt))
+                    continue
+                if is_retryable(status):
+                    limiter.pause(backoff_delay(response.headers, attempt))
+                    continue
+                limiter.on_success()
+                if status != 200:
+                    return status, None
+                return status, await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            limiter.pause(backoff_delay({}, attempt))  # Transient network error: try again
+    return status, None
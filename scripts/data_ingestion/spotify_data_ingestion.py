@@ -1,69 +1,265 @@
-import requests
-import json
-import base64
+import asyncio
 import time
 import os
 
+from http_client import get_session, create_async_session, get_spotify_token
+from rate_limiter import FetchError, RateLimiter, request_with_backoff, request_with_backoff_async
+from artist_id_cache import default_cache_path, load_artist_ids, save_artist_ids, forget_artist_ids
+from checkpoint import CHECKPOINT_MAX_AGE, IngestionCheckpoint, default_checkpoint_dir
+
 """# Spotify Data Ingestion
 Fetch data from the Spotify API and save the resulting .json files to the temporal landing zone.
 """
 
+# API endpoints (overridable, e.g. to point the ingestion to a local stub server)
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+
+# The several artists endpoint (/v1/artists?ids=) accepts up to 50 IDs per request
+MAX_IDS_PER_REQUEST = 50
+
 def get_headers_spotify(client_id, client_secret):
     """ Function that creates the 'header' object (Spotify credentials), needed to retrieve data from Spotify API.
+    The access token is cached and only requested again when it is about to expire (see http_client.py).
     """
-    auth_str = f"{client_id}:{client_secret}"
-    b64_auth_str = base64.b64encode(auth_str.encode()).decode()
-    # Request access token
-    url = "https://accounts.spotify.com/api/token"
-    headers = {
-        "Authorization": f"Basic {b64_auth_str}"
-    }
-    data = {
-        "grant_type": "client_credentials"
-    }
-    response = requests.post(url, headers=headers, data=data)
-    access_token = response.json()['access_token']
-    # Headers with access token
-    headers = { 
-        "Authorization": f"Bearer {access_token}"
+    return get_spotify_token(client_id, client_secret, SPOTIFY_TOKEN_URL).headers()
+
+def spotify_get(token, limiter, url, params):
+    """ GET request to the Spotify API through the shared session, retrying throttled and failed requests.
+    """
+    def send():
+        return get_session().get(url, params=params, headers=token.headers())
+
+    response = request_with_backoff(limiter, send)
+    if response is not None and response.status_code == 401:  # Token revoked before its expiry: request a new one
+        token.invalidate()
+        response = request_with_backoff(limiter, send)
+    return response
+
+def artist_record(artist_data):
+    """ Function that given a Spotify artist object, returns the information stored in the raw zone.
+    """
+    return {
+        'artist': artist_data['name'],
+        'genres': artist_data['genres'],
+        'followers': artist_data['followers']['total'],
+        'popularity': artist_data['popularity']
     }
-    return headers
 
-def ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename):
-    """ Function that retrieves data from Spotify API.
+def first_artist(result):
+    """ Function that given a Spotify search response, returns the first artist object found (or None).
     """
-    headers = get_headers_spotify(client_id, client_secret)
-    
-    artist_info = []
-    for artist_name in artist_names:
-        search_url = f"https://api.spotify.com/v1/search?q={artist_name}&type=artist"
-        response = requests.get(search_url, headers=headers)
-        time.sleep(0.5)  # Avoid exceeding the API request limit
-        
-        # Check if the request was successful
-        if response.status_code == 200:
-            result = response.json()
-            
-            if 'artists' in result and len(result['artists']['items']) > 0:
-                artist_data = result['artists']['items'][0]  # Get the first result if more than one result is found
-                artist_info.append({
-                    'artist': artist_data['name'],
-                    'genres': artist_data['genres'],
-                    'followers': artist_data['followers']['total'],
-                    'popularity': artist_data['popularity']
-                })
-            else:
-                print(f"{time.time()}: Spotify response unsuccessful for artist \"{artist_name}\"")
+    if 'artists' in result and len(result['artists']['items']) > 0:
+        return result['artists']['items'][0]  # Get the first result if more than one result is found
+    return None
+
+def extract_artist_info(result):
+    """ Function that given a Spotify search response, returns the information of the first artist found (or None).
+    """
+    artist_data = first_artist(result)
+    return artist_record(artist_data) if artist_data is not None else None
 
-    # Save the results to a JSON file
+def id_batches(artist_ids):
+    """ Split the cached artist names in batches that can be refreshed with a single request.
+    """
+    names = list(artist_ids)
+    return [names[i:i + MAX_IDS_PER_REQUEST] for i in range(0, len(names), MAX_IDS_PER_REQUEST)]
+
+def update_artist_cache(cache_path, cached_ids, searched):
+    """ Save the IDs of the artists found by name, and forget the cached artists that could not be found anymore.
+    """
+    save_artist_ids(cache_path, {name: artist_data['id'] for name, artist_data in searched.items() if artist_data is not None})
+    forget_artist_ids(cache_path, [name for name, artist_data in searched.items() if artist_data is None and name in cached_ids])
+
+def finalize_spotify_data(checkpoint, artist_names, raw_data_path, out_filename):
+    """ Function that writes the checkpointed artists to a JSON file in the raw data directory.
+    """
     if not os.path.exists(raw_data_path): # If the path to the temporal directory doesn't exist, create it
         os.makedirs(raw_data_path)
     output_path = os.path.join(raw_data_path, out_filename)
-    with open(output_path, 'w') as json_file:
-        json.dump(artist_info, json_file, indent=4)
+    checkpoint.finalize(output_path, artist_names)
 
     print(f"Spotify data has been saved to {output_path}")
 
+def search_artist(token, limiter, artist_name):
+    """ Search an artist by name, returning the first Spotify artist object found (or None).
+    Raises FetchError if the search request failed.
+    """
+    response = spotify_get(token, limiter, f"{SPOTIFY_API_URL}/search", {'q': artist_name, 'type': 'artist'})
+
+    # Check if the request was successful
+    if response is None or response.status_code != 200:
+        raise FetchError(f"search failed (status {None if response is None else response.status_code})")
+    artist_data = first_artist(response.json())
+    if artist_data is None:
+        print(f"{time.time()}: Spotify response unsuccessful for artist \"{artist_name}\"")
+    return artist_data
+
+def fetch_artists_by_id(token, limiter, spotify_ids):
+    """ Fetch up to 50 artists with a single request. Returns their artist objects in the order of `spotify_ids` (None if not found,
+    or for all of them if the request failed: they are then searched by name).
+    """
+    response = spotify_get(token, limiter, f"{SPOTIFY_API_URL}/artists", {'ids': ','.join(spotify_ids)})
+    if response is None or response.status_code != 200:
+        return [None] * len(spotify_ids)
+    return response.json().get('artists', [None] * len(spotify_ids))
+
+def ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename, concurrency=None, rate_limit=None,
+                        use_cache=True, cache_path=None, checkpoint_dir=None, checkpoint_max_age=CHECKPOINT_MAX_AGE):
+    """ Function that retrieves data from Spotify API.
+
+    - concurrency: if set, the artists are fetched by the asynchronous engine with at most
+      `concurrency` requests in flight (see ingest_spotify_data_async). Otherwise they are fetched one by one.
+    - rate_limit: maximum requests per second (defaults to the Spotify quota in SOURCE_QUOTAS).
+    - use_cache: look up the Spotify IDs of known artists in the name->ID cache (see artist_id_cache.py) and refresh them
+      in batches of 50 IDs; only the artists not in the cache are searched by name.
+    - cache_path: location of the cache (defaults to a DuckDB file next to the raw data directory).
+    - checkpoint_dir: where the progress of the run is checkpointed (defaults to a directory next to the raw data directory).
+      An interrupted run resumes from its checkpoint when it is run again with the same `out_filename` and artist list (see checkpoint.py).
+    - checkpoint_max_age: seconds after which a checkpoint is discarded instead of resumed.
+    """
+    if concurrency:
+        asyncio.run(ingest_spotify_data_async(client_id, client_secret, artist_names, raw_data_path, out_filename,
+                                              concurrency=concurrency, rate_limit=rate_limit,
+                                              use_cache=use_cache, cache_path=cache_path, checkpoint_dir=checkpoint_dir,
+                                              checkpoint_max_age=checkpoint_max_age))
+        return
+
+    token = get_spotify_token(client_id, client_secret, SPOTIFY_TOKEN_URL)  # Cached, refreshed before it expires
+    limiter = RateLimiter.for_source('spotify', rate=rate_limit)  # Avoid exceeding the API request limit
+
+    # Skip the artists completed by a previous (interrupted) run
+    checkpoint = IngestionCheckpoint(checkpoint_dir or default_checkpoint_dir(raw_data_path), out_filename, artist_names,
+                                     checkpoint_max_age)
+    remaining = [name for name in dict.fromkeys(artist_names) if not checkpoint.is_completed(name)]
+
+    cache_path = cache_path or default_cache_path(raw_data_path)
+    cached_ids = load_artist_ids(cache_path, remaining) if use_cache else {}
+    searched = {}  # Artists looked up by name in this run
+
+    def complete(artist_name, artist_data):
+        checkpoint.write(artist_name, [artist_record(artist_data)] if artist_data is not None else [])
+
+    def lookup_name(artist_name):
+        try:
+            searched[artist_name] = search_artist(token, limiter, artist_name)
+        except FetchError as error:
+            checkpoint.fail(artist_name, error)
+            return
+        complete(artist_name, searched[artist_name])
+
+    # Refresh the known artists by ID, falling back to a search if their ID is no longer valid
+    for batch in id_batches(cached_ids):
+        artists = fetch_artists_by_id(token, limiter, [cached_ids[name] for name in batch])
+        for artist_name, artist_data in zip(batch, artists):
+            if artist_data is not None:
+                complete(artist_name, artist_data)
+            else:
+                lookup_name(artist_name)
+
+    # Search the new artists by name
+    for artist_name in remaining:
+        if not checkpoint.is_completed(artist_name) and artist_name not in checkpoint.failed:
+            lookup_name(artist_name)
+
+    if use_cache:
+        update_artist_cache(cache_path, cached_ids, searched)
+
+    # Save the results to a JSON file (in the order of the input artist names)
+    finalize_spotify_data(checkpoint, artist_names, raw_data_path, out_filename)
+
+"""## Asynchronous ingestion
+Artists are fetched concurrently by a pool of workers sharing one HTTP session. Instead of sleeping after every
+request, the workers are paced by an adaptive token bucket, so the ingestion time is bounded by the API quota
+and not by the round-trip latency of each request.
+"""
+
+async def spotify_get_async(session, token, limiter, url, params):
+    """ Asynchronous GET request to the Spotify API, retrying throttled and failed requests. Returns the JSON payload (or None).
+    """
+    status, result = await request_with_backoff_async(limiter, session, url, params=params, headers=token.headers())
+    if status == 401:  # Token revoked before its expiry: request a new one
+        token.invalidate()
+        status, result = await request_with_backoff_async(limiter, session, url, params=params, headers=token.headers())
+    return result
+
+async def search_artist_async(session, token, limiter, artist_name):
+    """ Search an artist by name, returning the first Spotify artist object found (or None).
+    Raises FetchError if the search request failed.
+    """
+    result = await spotify_get_async(session, token, limiter, f"{SPOTIFY_API_URL}/search", {'q': artist_name, 'type': 'artist'})
+    if result is None:
+        raise FetchError("search failed")
+
+    artist_data = first_artist(result)
+    if artist_data is None:
+        print(f"{time.time()}: Spotify response unsuccessful for artist \"{artist_name}\"")
+    return artist_data
+
+async def fetch_artists_by_id_async(session, token, limiter, spotify_ids):
+    """ Fetch up to 50 artists with a single request. Returns their artist objects in the order of `spotify_ids` (None if not found,
+    or for all of them if the request failed: they are then searched by name).
+    """
+    result = await spotify_get_async(session, token, limiter, f"{SPOTIFY_API_URL}/artists", {'ids': ','.join(spotify_ids)})
+    if result is None:
+        return [None] * len(spotify_ids)
+    return result.get('artists', [None] * len(spotify_ids))
+
+async def ingest_spotify_data_async(client_id, client_secret, artist_names, raw_data_path, out_filename, concurrency=8, rate_limit=None,
+                                    use_cache=True, cache_path=None, checkpoint_dir=None, checkpoint_max_age=CHECKPOINT_MAX_AGE):
+    """ Function that retrieves data from Spotify API with `concurrency` requests in flight, paced to `rate_limit` requests per second
+    (defaults to the Spotify quota in SOURCE_QUOTAS). See ingest_spotify_data for the cache and checkpoint options.
+    The output file has the same layout as the sequential ingestion (artists in the order of `artist_names`).
+    """
+    token = get_spotify_token(client_id, client_secret, SPOTIFY_TOKEN_URL)  # Cached, refreshed before it expires
+    limiter = RateLimiter.for_source('spotify', rate=rate_limit)
+
+    # Skip the artists completed by a previous (interrupted) run
+    checkpoint = IngestionCheckpoint(checkpoint_dir or default_checkpoint_dir(raw_data_path), out_filename, artist_names,
+                                     checkpoint_max_age)
+    remaining = [name for name in dict.fromkeys(artist_names) if not checkpoint.is_completed(name)]
+
+    cache_path = cache_path or default_cache_path(raw_data_path)
+    cached_ids = load_artist_ids(cache_path, remaining) if use_cache else {}
+    searched = {}  # Artists looked up by name in this run
+
+    def complete(artist_name, artist_data):
+        checkpoint.write(artist_name, [artist_record(artist_data)] if artist_data is not None else [])
+
+    async def lookup_name(session, artist_name):
+        try:
+            searched[artist_name] = await search_artist_async(session, token, limiter, artist_name)
+        except FetchError as error:
+            checkpoint.fail(artist_name, error)
+            return
+        complete(artist_name, searched[artist_name])
+
+    async def lookup_batch(session, batch):
+        artists = await fetch_artists_by_id_async(session, token, limiter, [cached_ids[name] for name in batch])
+        for artist_name, artist_data in zip(batch, artists):
+            if artist_data is not None:
+                complete(artist_name, artist_data)
+            else:
+                await lookup_name(session, artist_name)  # The cached ID is no longer valid
+
+    # Batches of known artists first, then the new artists by name
+    jobs = [(lookup_batch, batch) for batch in id_batches(cached_ids)]
+    jobs += [(lookup_name, name) for name in remaining if name not in cached_ids]
+    pending = iter(jobs)  # Shared by all the workers
+
+    async def worker(session):
+        for job, arg in pending:
+            await job(session, arg)
+
+    async with create_async_session(concurrency) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+    if use_cache:
+        update_artist_cache(cache_path, cached_ids, searched)
+
+    # Save the results to a JSON file (in the order of the input artist names)
+    finalize_spotify_data(checkpoint, artist_names, raw_data_path, out_filename)
+
 if __name__ == "__main__":
     # Spotify credentials
     client_id = input("Spotify client id: ") 
@@ -79,6 +275,10 @@ if __name__ == "__main__":
 
     # Output file name
     out_filename = input("Output .json file name: ").strip()
+
+    # Concurrent requests (empty for the sequential ingestion)
+    concurrency = input("Concurrent requests (leave empty for sequential ingestion): ").strip()
+    concurrency = int(concurrency) if concurrency else None
     
     # Run function
-    ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename)
\ No newline at end of file
+    ingest_spotify_data(client_id, client_secret, artist_names, raw_data_path, out_filename, concurrency=concurrency)
\ No newline at end of file
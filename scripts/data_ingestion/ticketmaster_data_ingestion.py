@@ -1,12 +1,21 @@
-import requests
-import json
-import time
+import asyncio
 import os
 
+from http_client import get_session, create_async_session
+from rate_limiter import FetchError, RateLimiter, request_with_backoff, request_with_backoff_async
+from checkpoint import CHECKPOINT_MAX_AGE, IngestionCheckpoint, default_checkpoint_dir
+
 """# Ticketmaster data ingestion
 Fetch data from the Ticketmaster API and saves the resulting .json files in the temporal landing zone.
 """
 
+# API endpoint (overridable, e.g. to point the ingestion to a local stub server)
+TICKETMASTER_API_URL = "https://app.ticketmaster.com/discovery/v2"
+
+# The Discovery API returns at most 200 events per page and only the first 1000 events of a search (size * page < 1000)
+MAX_PAGE_SIZE = 200
+MAX_DEEP_PAGING = 1000
+
 def extract_event_info(artist, event):
     """ Function that given a TicketMaster 'event', returns its available information (date, location, price, etc.)
     """
@@ -36,41 +45,161 @@ def extract_event_info(artist, event):
 
     return event_info
 
-def ingest_ticketmaster_data(api_key, artist_names, raw_data_path, out_filename):
-    """ Function that retrieves data from TicketMaster API.
+def page_events(artist, payload):
+    """ Function that extracts the information of the events in one page of the events search.
     """
+    if '_embedded' in payload and 'events' in payload['_embedded']:
+        return [extract_event_info(artist, event) for event in payload['_embedded']['events']]
+    return []
 
-    # List to store the events found for the given artists
-    all_artist_events = []
-
-    # For each of the artists in the artis_names list, store its event information in the all_artist_events list
-    for artist_name in artist_names:
-        url = f"https://app.ticketmaster.com/discovery/v2/events.json?keyword={artist_name}&apikey={api_key}"
-        response = requests.get(url) # Request response from the TicketMaster API
-        time.sleep(0.5) # Avoid exceeding the API request limit
-
-        # Check if the request was successful
-        if response.status_code == 200:
-            artist_events = response.json()
-            
-            # Extraer eventos si existen
-            if '_embedded' in artist_events and 'events' in artist_events['_embedded']:
-                for event in artist_events['_embedded']['events']:
-                    event_data = extract_event_info(artist_name, event)
-                    all_artist_events.append(event_data)
-        else:
-            pass
-            # print(f"{time.time()}: Ticketmaster response unsuccessful for artist \"{artist_name}\"")
-          
-    # Save the results to a JSON file
+def check_page_size(page_size):
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError(f"Invalid page size: {page_size} (expected between 1 and {MAX_PAGE_SIZE})")
+
+def total_pages(payload, page_size):
+    """ Number of pages of a search that can be retrieved, given its first page.
+    """
+    n_pages = payload.get('page', {}).get('totalPages', 1)
+    return max(1, min(n_pages, MAX_DEEP_PAGING // page_size))
+
+def events_params(api_key, artist_name, page_size, page):
+    """ Query parameters to request one page of the events of an artist.
+    """
+    return {'keyword': artist_name, 'apikey': api_key, 'size': page_size, 'page': page}
+
+def page_error(page, status):
+    return FetchError(f"page {page} of the events search failed (status {status})")
+
+def iter_artist_events(api_key, artist_name, limiter, page_size=MAX_PAGE_SIZE):
+    """ Generator that yields the information of all the events of an artist, requesting the result pages one by one.
+    Only the current page is kept in memory. Raises FetchError if a page could not be fetched, so that a partial
+    result is never taken for the events of the artist.
+    """
+    n_pages = 1
+    page = 0
+    while page < n_pages:
+        params = events_params(api_key, artist_name, page_size, page)
+        response = request_with_backoff(limiter, lambda: get_session().get(f"{TICKETMASTER_API_URL}/events.json", params=params))
+        if response is None or response.status_code != 200:
+            raise page_error(page, None if response is None else response.status_code)
+        payload = response.json()
+        if page == 0:
+            n_pages = total_pages(payload, page_size)
+        yield from page_events(artist_name, payload)
+        page += 1
+
+def finalize_ticketmaster_data(checkpoint, artist_names, raw_data_path, out_filename):
+    """ Function that writes the checkpointed events to a JSON file in the raw data directory.
+    """
     if not os.path.exists(raw_data_path): # If the raw_data_path path doesn't exist, create it
         os.makedirs(raw_data_path)
     output_path = os.path.join(raw_data_path, out_filename)
-    with open(output_path, 'w') as json_file:
-        json.dump(all_artist_events, json_file, indent=4)
+    checkpoint.finalize(output_path, artist_names)
 
     print(f"Ticketmaster data has been saved to {output_path}")
 
+def ingest_ticketmaster_data(api_key, artist_names, raw_data_path, out_filename, concurrency=None, rate_limit=None, page_size=MAX_PAGE_SIZE,
+                             checkpoint_dir=None, checkpoint_max_age=CHECKPOINT_MAX_AGE):
+    """ Function that retrieves data from TicketMaster API.
+
+    - concurrency: if set, the artists (and the result pages of each artist) are fetched by the asynchronous
+      engine with at most `concurrency` requests in flight (see ingest_ticketmaster_data_async).
+    - rate_limit: maximum requests per second (defaults to the Ticketmaster quota in SOURCE_QUOTAS).
+    - page_size: events requested per result page (between 1 and 200, ValueError otherwise).
+    - checkpoint_dir: where the progress of the run is checkpointed (defaults to a directory next to the raw data directory).
+      An interrupted run resumes from its checkpoint when it is run again with the same `out_filename` and artist list (see checkpoint.py).
+    - checkpoint_max_age: seconds after which a checkpoint is discarded instead of resumed.
+    """
+    check_page_size(page_size)
+    if concurrency:
+        asyncio.run(ingest_ticketmaster_data_async(api_key, artist_names, raw_data_path, out_filename,
+                                                   concurrency=concurrency, rate_limit=rate_limit, page_size=page_size,
+                                                   checkpoint_dir=checkpoint_dir, checkpoint_max_age=checkpoint_max_age))
+        return
+
+    # Events are appended to the checkpoint as each artist is completed (skipping those completed by a previous run)
+    checkpoint = IngestionCheckpoint(checkpoint_dir or default_checkpoint_dir(raw_data_path), out_filename, artist_names,
+                                     checkpoint_max_age)
+
+    # Pace the requests to avoid exceeding the API request limit
+    limiter = RateLimiter.for_source('ticketmaster', rate=rate_limit)
+
+    # For each of the artists in the artis_names list, store its event information in the checkpoint
+    # (an artist whose events could not all be fetched is not completed)
+    for artist_name in dict.fromkeys(artist_names):
+        if not checkpoint.is_completed(artist_name):
+            try:
+                checkpoint.write(artist_name, list(iter_artist_events(api_key, artist_name, limiter, page_size)))
+            except FetchError as error:
+                checkpoint.fail(artist_name, error)
+          
+    # Save the results to a JSON file
+    finalize_ticketmaster_data(checkpoint, artist_names, raw_data_path, out_filename)
+
+"""## Asynchronous ingestion
+The first result page of each artist tells how many pages there are; the remaining pages are then requested
+concurrently under the shared rate limit. Every page is reduced to its event information as soon as it arrives,
+so the raw responses are never buffered, and the events are emitted in page order, like the sequential ingestion.
+"""
+
+async def fetch_page_async(session, limiter, api_key, artist_name, page_size, page):
+    """ Request one page of the events of an artist. Returns the number of pages of the search and the events of the page.
+    Raises FetchError if the page could not be fetched.
+    """
+    status, payload = await request_with_backoff_async(limiter, session, f"{TICKETMASTER_API_URL}/events.json",
+                                                       params=events_params(api_key, artist_name, page_size, page))
+    if payload is None:
+        raise page_error(page, status)
+    return total_pages(payload, page_size), page_events(artist_name, payload)
+
+async def iter_artist_events_async(session, limiter, api_key, artist_name, page_size=MAX_PAGE_SIZE):
+    """ Asynchronous generator that yields the events of an artist page by page, in page order. Raises FetchError if
+    a page could not be fetched (the pages still in flight are then cancelled).
+    """
+    n_pages, events = await fetch_page_async(session, limiter, api_key, artist_name, page_size, 0)
+    for event_data in events:
+        yield event_data
+
+    pages = [asyncio.ensure_future(fetch_page_async(session, limiter, api_key, artist_name, page_size, page))
+             for page in range(1, n_pages)]
+    try:
+        results = await asyncio.gather(*pages)
+    finally:
+        for next_page in pages:
+            next_page.cancel()
+    for _, events in results:
+        for event_data in events:
+            yield event_data
+
+async def ingest_ticketmaster_data_async(api_key, artist_names, raw_data_path, out_filename, concurrency=8, rate_limit=None, page_size=MAX_PAGE_SIZE,
+                                         checkpoint_dir=None, checkpoint_max_age=CHECKPOINT_MAX_AGE):
+    """ Function that retrieves data from TicketMaster API with `concurrency` requests in flight, paced to `rate_limit` requests per second
+    (defaults to the Ticketmaster quota in SOURCE_QUOTAS). The events are saved grouped by artist, in the order of `artist_names`.
+    See ingest_ticketmaster_data for the page size and checkpoint options.
+    """
+    check_page_size(page_size)
+    limiter = RateLimiter.for_source('ticketmaster', rate=rate_limit)
+
+    # Events are appended to the checkpoint as each artist is completed (skipping those completed by a previous run)
+    checkpoint = IngestionCheckpoint(checkpoint_dir or default_checkpoint_dir(raw_data_path), out_filename, artist_names,
+                                     checkpoint_max_age)
+    pending = (name for name in dict.fromkeys(artist_names) if not checkpoint.is_completed(name))  # Shared by all the workers
+
+    async def worker(session):
+        for artist_name in pending:
+            try:
+                events = [event_data async for event_data in iter_artist_events_async(session, limiter, api_key, artist_name, page_size)]
+            except FetchError as error:
+                checkpoint.fail(artist_name, error)
+                continue
+            checkpoint.write(artist_name, events)
+
+    async with create_async_session(concurrency) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+    # Save the results to a JSON file (grouped by artist, in the order of the input artist names)
+    finalize_ticketmaster_data(checkpoint, artist_names, raw_data_path, out_filename)
+
 if __name__ == "__main__":
     # TicketMaster credentials
     api_key = input("TicketMaster API key: ")
@@ -85,6 +214,10 @@ if __name__ == "__main__":
     
     # Output file name
     out_filename = input("Output .json file name: ").strip() 
+
+    # Concurrent requests (empty for the sequential ingestion)
+    concurrency = input("Concurrent requests (leave empty for sequential ingestion): ").strip()
+    concurrency = int(concurrency) if concurrency else None
     
     # Run function
-    ingest_ticketmaster_data(api_key, artist_names, raw_data_path, out_filename)
\ No newline at end of file
+    ingest_ticketmaster_data(api_key, artist_names, raw_data_path, out_filename, concurrency=concurrency)
\ No newline at end of file
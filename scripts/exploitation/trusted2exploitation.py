@@ -1,9 +1,15 @@
 import os
+import sys
 import duckdb
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'storage'))
+from zone_storage import is_parquet_zone, register_zone
+
 """ Trusted to Exploitation
 In the transition from the Trusted Zone to the Exploitation Zone, we reorganize the tables 
 from the trusted database into a new database that focuses on key entities relevant to our analysis.
+The trusted zone can also be a Parquet zone (see zone_storage.py): DuckDB then scans it directly and only reads the
+columns used by each exploitation table.
 """
 
 def drop_all_tables(database_path):
@@ -26,17 +32,20 @@ def drop_all_tables(database_path):
 def trusted2exploit(duckdb_file_path, exploit_dir):
     """
     Creates a new exploitation DuckDB database with selected tables from the trusted database.
+    `duckdb_file_path` is the trusted DuckDB database, or a trusted Parquet zone directory.
     """
+    parquet_zone = is_parquet_zone(duckdb_file_path)
 
-    # Connect to the trusted database
-    con_trusted = duckdb.connect(database=duckdb_file_path, read_only=True)
+    if not parquet_zone:
+        # Connect to the trusted database
+        con_trusted = duckdb.connect(database=duckdb_file_path, read_only=True)
 
-    # Load tables from the trusted database
-    ticketmaster_df = con_trusted.execute("SELECT * FROM ticketmaster").df()
-    spotify_df = con_trusted.execute("SELECT * FROM spotify").df()
+        # Load tables from the trusted database
+        ticketmaster_df = con_trusted.execute("SELECT * FROM ticketmaster").df()
+        spotify_df = con_trusted.execute("SELECT * FROM spotify").df()
 
-    # Close connection
-    con_trusted.close()
+        # Close connection
+        con_trusted.close()
 
     # Create the exploitation directory if it doesn't exist
     if not os.path.exists(exploit_dir):
@@ -49,6 +58,10 @@ def trusted2exploit(duckdb_file_path, exploit_dir):
     # Connect to the new exploitation database
     con_exploit = duckdb.connect(database=exploit_duckdb_path)
 
+    # Parquet trusted zone: spotify_df and ticketmaster_df are views scanning the Parquet datasets (no pandas round trip)
+    if parquet_zone:
+        register_zone(con_exploit, duckdb_file_path, suffix='_df')
+
     # Create new tables in the exploitation database from dataframes
     con_exploit.execute("CREATE TABLE artists AS SELECT artist, genres, source_date FROM spotify_df WHERE source_date = (SELECT MAX(source_date) FROM spotify_df)")
     con_exploit.execute("CREATE TABLE artists_stats AS SELECT artist, popularity, followers, source_date FROM spotify_df")
@@ -148,7 +161,7 @@ def add_tables_to_duckdb(duckdb_file):
     print(f"Pre-computed tables successfully added in: {duckdb_file}")
 
 if __name__ == "__main__":
-    duckdb_file_path = input("Path to DuckDB file (input): ")
+    duckdb_file_path = input("Path to DuckDB file or Parquet zone directory (input): ")
     exploit_dir = input("Exploitation directory path (output): ")
     trusted2exploit(duckdb_file_path, exploit_dir)
     exploit_duckdb_path = os.path.join(exploit_dir, 'exploitation.duckdb')
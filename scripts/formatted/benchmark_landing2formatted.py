@@ -0,0 +1,93 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'landing'))
+from landing2formatted import landing2formatted
+from landing_files import write_records
+
+try:
+    import resource  # Peak memory of the conversion (not available on Windows)
+except ImportError:
+    resource = None
+
+"""# landing2formatted benchmark
+Compare the conversion engines of landing2formatted (pandas and the native DuckDB JSON reader) on a synthetic
+persistent landing zone: a Ticketmaster snapshot of the raw zone repeated `scale` times. Every engine runs in its own
+process so its peak memory (max RSS) can be measured, and the resulting tables are checked to be identical.
+
+Usage (from the repository root):
+    python ./scripts/formatted/benchmark_landing2formatted.py --scale 50
+"""
+
+def build_landing_zone(raw_file, scale, persdir, compression):
+    """ Write a persistent landing zone with one Ticketmaster snapshot made of the records of `raw_file` repeated `scale` times.
+    """
+    with open(raw_file) as json_file:
+        records = json.load(json_file) * scale
+    source_dir = os.path.join(persdir, 'ticketmaster_source')
+    os.makedirs(source_dir)
+    if compression is None:
+        path = os.path.join(source_dir, 'ticketmaster_01012025.json')
+        with open(path, 'w') as json_file:
+            json.dump(records, json_file, indent=4)  # Same layout as the ingestion output
+    else:
+        path = os.path.join(source_dir, 'ticketmaster_01012025.ndjson.gz')
+        write_records(records, path, compression)
+    return len(records), os.path.getsize(path)
+
+def run_engine(persdir, formdir, engine, results):
+    """ Run landing2formatted with one engine (in a child process) and report its time and peak memory.
+    """
+    sys.stdout = open(os.devnull, 'w')  # Keep the benchmark output clean
+    start = time.perf_counter()
+    landing2formatted(persdir, formdir, engine)
+    elapsed = time.perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource is not None else float('nan')  # MB (Linux: KB)
+    results[engine] = (elapsed, max_rss)
+
+def benchmark_landing2formatted(raw_file, scale, compression, engines=('pandas', 'duckdb')):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        persdir = os.path.join(tmp_dir, 'persistent')
+        n_records, size = build_landing_zone(raw_file, scale, persdir, compression)
+        print(f"Landing file: {n_records} records, {size / 1e6:.1f} MB ({compression or 'JSON'})")
+
+        results = multiprocessing.Manager().dict()
+        for engine in engines:
+            process = multiprocessing.Process(target=run_engine, args=(persdir, os.path.join(tmp_dir, engine), engine, results))
+            process.start()
+            process.join()
+
+        for engine in engines:
+            elapsed, max_rss = results[engine]
+            print(f"{engine:<8} {elapsed:>7.2f}s  {n_records / elapsed:>12,.0f} records/s  peak memory {max_rss:>7.0f} MB")
+
+        # Both engines must produce the same table
+        con = duckdb.connect()
+        for engine in engines:
+            con.execute(f"ATTACH '{os.path.join(tmp_dir, engine, 'formatted.duckdb')}' AS {engine} (READ_ONLY)")
+        first, *others = engines
+        for other in others:
+            differences = con.execute(f"""
+                SELECT count(*) FROM (
+                    (SELECT * FROM {first}.ticketmaster_01012025 EXCEPT ALL SELECT * FROM {other}.ticketmaster_01012025)
+                    UNION ALL
+                    (SELECT * FROM {other}.ticketmaster_01012025 EXCEPT ALL SELECT * FROM {first}.ticketmaster_01012025)
+                )
+            """).fetchone()[0]
+            print(f"Same table with {first} and {other}: {differences == 0}")
+        con.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the landing2formatted conversion engines.")
+    parser.add_argument('--raw-file', default='./data/raw/ticketmaster_data_V2.json', help="Raw Ticketmaster file used to build the snapshot")
+    parser.add_argument('--scale', type=int, default=50, help="Number of times the raw records are repeated")
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default=None, help="Store the snapshot as compressed NDJSON")
+    args = parser.parse_args()
+
+    benchmark_landing2formatted(args.raw_file, args.scale, args.compression)
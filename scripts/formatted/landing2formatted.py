@@ -1,22 +1,53 @@
 import pandas as pd
-import json
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import duckdb
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'landing'))
+from landing_files import is_landing_file, read_records, strip_landing_extension
+from landing_catalog import catalog_path, latest_version, snapshots_since
+from raw2temporal import file_hash
+
 """
 Persistent landing zone to formatted zone
 Take all the files in the system (persistent landing zone) and unify the formats from JSON to DuckDB database.
+Compressed NDJSON files (see landing_files.py) are read transparently. The converted files are recorded in the
+meta.converted_files table of the formatted database, so later runs only convert the new or modified files.
+When the persistent landing has a landing catalog (see landing_catalog.py), the version of the catalog converted by
+the last run is recorded too (meta.converted_catalog), and later runs only check the snapshots landed since that
+version instead of walking the whole persistent landing.
+
+Two conversion engines are available:
+- 'pandas': the file is loaded in memory, normalized with pandas and copied into DuckDB.
+- 'duckdb': DuckDB scans the file itself with its JSON reader (streaming, multi-threaded) using the explicit
+  schema of the source (FORMATTED_SCHEMAS), so the column types do not depend on type inference.
+
+With the pandas engine and several `workers`, the files are parsed and normalized in parallel processes while a
+single writer loads the resulting DataFrames into the formatted database, in one transaction.
 """
 
-def convert_json_to_duckdb(json_file_path, con):
-    """ Function to convert .json to DuckDB.
+# Column types of the formatted tables (the ones produced by the pandas engine)
+FORMATTED_SCHEMAS = {
+    'spotify': {'artist': 'VARCHAR', 'genres': 'VARCHAR[]', 'followers': 'BIGINT', 'popularity': 'BIGINT'},
+    'ticketmaster': {'artist': 'VARCHAR', 'name': 'VARCHAR', 'date': 'VARCHAR', 'time': 'VARCHAR',
+                     'venue': 'VARCHAR', 'location': 'VARCHAR', 'price_range': 'VARCHAR'}
+}
+
+def parse_json_file(json_file_path):
+    """ Function to load a landing file into a pandas DataFrame (run in worker processes in parallel mode).
     """
-    # Load the JSON data
-    with open(json_file_path, 'r') as json_file:
-        data = json.load(json_file)
+    # Load the JSON data (.json, or .ndjson optionally compressed)
+    data = read_records(json_file_path)
 
     # Convert the JSON data to a pandas DataFrame
-    df = pd.json_normalize(data)
+    return pd.json_normalize(data)
+
+def convert_json_to_duckdb(json_file_path, con, df=None):
+    """ Function to convert .json to DuckDB. `df` is the already parsed file, if any.
+    """
+    if df is None:
+        df = parse_json_file(json_file_path)
 
     # Print the shape of the DataFrame
     print(f"Loaded DataFrame shape from {json_file_path}: {df.shape}")
@@ -25,17 +56,137 @@ def convert_json_to_duckdb(json_file_path, con):
     con.register("temp_df", df)
 
     # Save the DataFrame into a DuckDB table (name the table after the JSON file, without extension)
-    table_name = os.path.basename(json_file_path).replace('.json', '')
+    table_name = strip_landing_extension(os.path.basename(json_file_path))
     con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM temp_df")
+    con.unregister("temp_df")
 
 
     # Print confirmation of table creation
     print(f'Table {table_name} created in DuckDB database with shape: {df.shape}')
 
-def landing2formatted(persdir_in, formdir_out):
+def scan_json_to_duckdb(json_file_path, con):
+    """ Function to convert .json to DuckDB with the native JSON reader of DuckDB (no intermediate DataFrame).
+    """
+    table_name = strip_landing_extension(os.path.basename(json_file_path))
+    source = table_name.split('_')[0]
+
+    # Landing files are JSON arrays (.json) or NDJSON (.ndjson, .ndjson.gz, .ndjson.zst: decompressed by DuckDB).
+    # The ingestion_date=... directories are not turned into a column, like with the pandas engine
+    json_format = 'array' if json_file_path.endswith('.json') else 'newline_delimited'
+    columns = ''
+    if source in FORMATTED_SCHEMAS:
+        columns = ', '.join(f"'{column}': '{column_type}'" for column, column_type in FORMATTED_SCHEMAS[source].items())
+        columns = f", columns={{{columns}}}"
+    else:
+        print(f"No schema defined for {json_file_path}, the column types are inferred")
+
+    con.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_json(?, format='{json_format}', hive_partitioning=false{columns})",
+                [json_file_path])
+
+    # Print confirmation of table creation
+    n_rows = con.execute(f"SELECT count(*) FROM {table_name}").fetchone()[0]
+    n_columns = len(con.execute(f"DESCRIBE {table_name}").fetchall())
+    print(f'Table {table_name} created in DuckDB database with shape: {(n_rows, n_columns)}')
+
+CONVERSION_ENGINES = {
+    'pandas': convert_json_to_duckdb,
+    'duckdb': scan_json_to_duckdb
+}
+
+def connect_conversion_log(con):
+    """ Create (if needed) the table recording the landing files already converted, in a separate 'meta' schema
+    so it is not listed with the data tables (SHOW TABLES).
+    """
+    con.execute("CREATE SCHEMA IF NOT EXISTS meta")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS meta.converted_files (
+            path VARCHAR PRIMARY KEY,
+            table_name VARCHAR NOT NULL,
+            size BIGINT NOT NULL,
+            mtime_ns BIGINT NOT NULL,
+            sha256 VARCHAR NOT NULL,
+            converted_at TIMESTAMP NOT NULL
+        )
+    """)
+
+def connect_catalog_log(con):
+    """ Create (if needed) the table recording the last landing catalog version converted from each persistent directory.
+    """
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS meta.converted_catalog (
+            persistent_dir VARCHAR PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+
+def catalog_landing_files(con, persdir_in):
+    """ Paths of the landing files landed since the catalog version converted by the last run, or None if they have
+    to be found by walking the persistent directory (no catalog, or no run against this catalog yet).
+    """
+    if not os.path.exists(catalog_path(persdir_in)):
+        return None
+    logged = con.execute("SELECT version FROM meta.converted_catalog WHERE persistent_dir = ?",
+                         [os.path.abspath(persdir_in)]).fetchone()
+    if logged is None:
+        return None
+    return [os.path.join(persdir_in, path) for path in snapshots_since(persdir_in, logged[0])['path']]
+
+def log_catalog_version(con, persdir_in, version):
+    con.execute("INSERT OR REPLACE INTO meta.converted_catalog VALUES (?, ?)", [os.path.abspath(persdir_in), version])
+
+def needs_conversion(con, relative_path, json_file_path, table_name):
+    """ Check whether a landing file has to be converted: it is new, or its content changed since its last conversion,
+    or its table is missing. Returns (needed, file stats to record).
+    """
+    stat = os.stat(json_file_path)
+    logged = con.execute("SELECT size, mtime_ns, sha256 FROM meta.converted_files WHERE path = ?", [relative_path]).fetchone()
+    table_exists = con.execute("SELECT count(*) FROM duckdb_tables() WHERE schema_name = 'main' AND table_name = ?",
+                               [table_name]).fetchone()[0] > 0
+
+    # Same size and modification time: unchanged, no need to read it
+    if logged is not None and table_exists and logged[:2] == (stat.st_size, stat.st_mtime_ns):
+        return False, None
+
+    sha256 = file_hash(json_file_path)
+    file_stats = (stat.st_size, stat.st_mtime_ns, sha256)
+    if logged is not None and table_exists and logged[2] == sha256:  # Touched but with the same content
+        log_conversion(con, relative_path, table_name, file_stats)
+        return False, None
+    return True, file_stats
+
+def log_conversion(con, relative_path, table_name, file_stats):
+    con.execute("""
+        INSERT OR REPLACE INTO meta.converted_files VALUES (?, ?, ?, ?, ?, now())
+    """, [relative_path, table_name, *file_stats])
+
+def convert_in_parallel(pending, con, workers):
+    """ Parse the pending landing files in `workers` processes and load them, as they are ready,
+    through the single connection `con` in one transaction (all the files are converted, or none).
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(parse_json_file, json_file_path): (json_file_path, relative_path, table_name, file_stats)
+                       for json_file_path, relative_path, table_name, file_stats in pending}
+            for future in as_completed(futures):
+                json_file_path, relative_path, table_name, file_stats = futures[future]
+                convert_json_to_duckdb(json_file_path, con, df=future.result())
+                log_conversion(con, relative_path, table_name, file_stats)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def landing2formatted(persdir_in, formdir_out, engine='pandas', incremental=True, workers=1):
     """ Function to iterate over .json files in the persistent directory,
         convert them to DuckDB, and save them in the formatted directory.
+        `engine` is the conversion engine: 'pandas' or 'duckdb' (see CONVERSION_ENGINES).
+        With `incremental`, the files already converted (same size and modification time, or same SHA-256)
+        are skipped, and only the snapshots landed since the last run are checked if the landing catalog
+        tells which ones they are; otherwise every file is converted again.
+        With the pandas engine, `workers` > 1 parses the files in that many processes (see convert_in_parallel).
     """
+    convert = CONVERSION_ENGINES[engine]
 
     if not os.path.exists(formdir_out):  # If the formatted directory doesn't exist, create it
         os.makedirs(formdir_out)
@@ -45,13 +196,49 @@ def landing2formatted(persdir_in, formdir_out):
 
     # Connect to DuckDB (create or open the .duckdb file)
     con = duckdb.connect(database=duckdb_file_path)
-
-    # Iterate over all the files in the persistent directory to change the format from JSON to DuckDB
-    for root, dirs, files in os.walk(persdir_in):
-        for file in files:
-            if file.endswith('.json'):  # Only process .json files
-                json_file_path = os.path.join(root, file)
-                convert_json_to_duckdb(json_file_path, con)
+    connect_conversion_log(con)
+    connect_catalog_log(con)
+
+    # Landing files to check: the snapshots landed since the last run according to the catalog, or otherwise
+    # all the files in the persistent directory
+    catalog_version = latest_version(persdir_in)  # Read first: snapshots landed during the run are left for the next one
+    json_file_paths = catalog_landing_files(con, persdir_in) if incremental else None
+    if json_file_paths is None:
+        json_file_paths = [os.path.join(root, file) for root, dirs, files in os.walk(persdir_in) for file in files]
+    else:
+        print(f"Landing catalog: {len(json_file_paths)} snapshots landed since the last run")
+
+    # Find the files to convert from JSON to DuckDB
+    pending = []
+    n_skipped = 0
+    for json_file_path in json_file_paths:
+        file = os.path.basename(json_file_path)
+        if is_landing_file(file) and os.path.exists(json_file_path):  # Only process .json files (or their compressed NDJSON versions)
+            relative_path = os.path.relpath(json_file_path, persdir_in)
+            table_name = strip_landing_extension(file)
+
+            needed, file_stats = needs_conversion(con, relative_path, json_file_path, table_name)
+            if incremental and not needed:
+                n_skipped += 1
+                continue
+            if file_stats is None:  # Full conversion of an unchanged file
+                stat = os.stat(json_file_path)
+                file_stats = (stat.st_size, stat.st_mtime_ns, file_hash(json_file_path))
+
+            pending.append((json_file_path, relative_path, table_name, file_stats))
+
+    if n_skipped:
+        print(f"Skipped {n_skipped} files already converted")
+
+    if engine == 'pandas' and workers > 1 and len(pending) > 1:
+        convert_in_parallel(pending, con, workers)
+    else:
+        for json_file_path, relative_path, table_name, file_stats in pending:
+            convert(json_file_path, con)
+            log_conversion(con, relative_path, table_name, file_stats)
+
+    if os.path.exists(catalog_path(persdir_in)):
+        log_catalog_version(con, persdir_in, catalog_version)
 
     # Close the DuckDB connection
     con.close()
@@ -62,4 +249,7 @@ def landing2formatted(persdir_in, formdir_out):
 if __name__ == "__main__":
     persdir_in = input("Persistent landing directory path (input): ")
     formdir_out = input("Formatted landing directory path (output): ")
-    landing2formatted(persdir_in, formdir_out)
\ No newline at end of file
+    engine = input("Conversion engine (pandas or duckdb, leave empty for pandas): ").strip() or 'pandas'
+    incremental = input("Convert only the new files? (Y/n): ").strip().lower() != 'n'
+    workers = input("Parallel workers for the pandas engine (leave empty for 1): ").strip()
+    landing2formatted(persdir_in, formdir_out, engine, incremental, int(workers) if workers else 1)
@@ -3,9 +3,14 @@ import matplotlib.pyplot as plt
 import duckdb
 from collections import Counter
 import numpy as np
+import os
+import sys
 import warnings
 import streamlit as st
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'trusted'))
+from formatted2trusted import table_source_date
+
 warnings.filterwarnings("ignore")
 
 """ Data Profiling
@@ -100,7 +105,7 @@ def quick_format_prep(db_file):
         table_name = table[0]
 
         # Extract the source (either "spotify" or "ticketmaster") and date from the table name
-        source, date = table_name.split('_', 1)
+        source, date = table_source_date(table_name)
         if source == 'ticketmaster':
 
           # Load data from the specified table
@@ -208,7 +213,7 @@ def spotify_profiling(duckdb_file_path):
     for table in tables:
         table_name = table[0]
         # Extract the source (either "spotify" or "ticketmaster") and date from the table name
-        source, date = table_name.split('_', 1)
+        source, date = table_source_date(table_name)
         if source == 'spotify':
             df = conn.execute(f"SELECT * FROM {table_name}").df()
             print(f"\nTable: {table_name}")
@@ -250,7 +255,7 @@ def ticketmaster_profiling(duckdb_file_path):
         table_name = table[0]
 
         # Extract the source (either "spotify" or "ticketmaster") and date from the table name
-        source, date = table_name.split('_', 1)
+        source, date = table_source_date(table_name)
         if source == 'ticketmaster':
             df = conn.execute(f"SELECT * FROM {table_name}").df()
 
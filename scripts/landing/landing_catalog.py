@@ -0,0 +1,94 @@
+import os
+import duckdb
+
+"""# Landing catalog
+DuckDB table recording every snapshot landed in the persistent landing zone: its version (increasing with every landed
+file, whatever its source), source, ingestion timestamp and date, row count, SHA-256, path (relative to the persistent
+directory) and table name. Downstream stages can ask for the snapshots landed since a given version instead of listing
+the directories and parsing dates back out of the file names (e.g. landing2formatted only looks at the snapshots
+landed since its last run).
+
+Snapshot names are '<source>_<DDMMYYYY>'; a second snapshot of the same source on the same day gets '_v<version>'
+appended (e.g. 'spotify_11102024_v7') instead of overwriting the first one.
+"""
+
+CATALOG_FILENAME = 'landing_catalog.duckdb'
+
+def catalog_path(persistdir):
+    return os.path.join(persistdir, CATALOG_FILENAME)
+
+SNAPSHOTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS snapshots (
+        version INTEGER PRIMARY KEY,
+        source VARCHAR NOT NULL,
+        ingestion_ts TIMESTAMP NOT NULL,
+        ingestion_date VARCHAR NOT NULL,
+        row_count BIGINT NOT NULL,
+        sha256 VARCHAR NOT NULL,
+        path VARCHAR NOT NULL,
+        table_name VARCHAR NOT NULL UNIQUE
+    )
+"""
+
+def connect_catalog(persistdir, read_only=False):
+    """ Open the catalog of a persistent landing directory, creating the snapshots table if needed.
+    """
+    if read_only:
+        return duckdb.connect(database=catalog_path(persistdir), read_only=True)
+    if not os.path.exists(persistdir):
+        os.makedirs(persistdir)
+    con = duckdb.connect(database=catalog_path(persistdir))
+    con.execute(SNAPSHOTS_TABLE)
+    return con
+
+def find_snapshot(con, source, sha256):
+    """ Version and table name of an already landed snapshot of `source` with the same content, or None.
+    """
+    return con.execute("SELECT version, table_name FROM snapshots WHERE source = ? AND sha256 = ?", [source, sha256]).fetchone()
+
+def next_version(con):
+    return con.execute("SELECT coalesce(max(version), 0) + 1 FROM snapshots").fetchone()[0]
+
+def snapshot_name(con, source, ingestion_date, version, taken=lambda name: False):
+    """ Table (and file) name of a new snapshot: '<source>_<DDMMYYYY>', or '<source>_<DDMMYYYY>_v<version>' if that name
+    is already in the catalog or `taken(name)` is true (e.g. a file landed before the catalog existed).
+    """
+    name = f"{source}_{ingestion_date}"
+    in_catalog = con.execute("SELECT count(*) FROM snapshots WHERE table_name = ?", [name]).fetchone()[0] > 0
+    if in_catalog or taken(name):
+        name = f"{name}_v{version}"
+    return name
+
+def register_snapshot(con, version, source, ingestion_ts, row_count, sha256, path, table_name):
+    """ Record a landed snapshot in the catalog.
+    """
+    con.execute("INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [version, source, ingestion_ts, ingestion_ts.strftime('%d%m%Y'), row_count, sha256, path, table_name])
+
+def latest_version(persistdir):
+    """ Version of the last landed snapshot (0 if nothing was landed).
+    """
+    if not os.path.exists(catalog_path(persistdir)):
+        return 0
+    con = connect_catalog(persistdir, read_only=True)
+    version = con.execute("SELECT coalesce(max(version), 0) FROM snapshots").fetchone()[0]
+    con.close()
+    return version
+
+def snapshots_since(persistdir, version=0, source=None):
+    """ DataFrame with the snapshots landed after `version` (all of them by default), optionally of a single source,
+    ordered by version. Without a catalog, the DataFrame is empty (the catalog is not created by a read).
+    """
+    if os.path.exists(catalog_path(persistdir)):
+        con = connect_catalog(persistdir, read_only=True)
+    else:
+        con = duckdb.connect()  # Empty in-memory catalog
+        con.execute(SNAPSHOTS_TABLE)
+    query = "SELECT * FROM snapshots WHERE version > ?"
+    params = [version]
+    if source is not None:
+        query += " AND source = ?"
+        params.append(source)
+    snapshots = con.execute(query + " ORDER BY version", params).df()
+    con.close()
+    return snapshots
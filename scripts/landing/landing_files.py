@@ -0,0 +1,69 @@
+import gzip
+import io
+import json
+try:
+    import zstandard  # Optional: only needed for the zstd storage mode
+except ImportError:
+    zstandard = None
+
+"""# Landing files
+Read and write the data files of the persistent landing zone, whatever their storage format:
+- JSON (.json): a list of records, as produced by the ingestion scripts.
+- NDJSON (.ndjson), optionally compressed with gzip (.ndjson.gz) or zstd (.ndjson.zst): one record per line.
+
+Downstream readers only need read_records(path), which picks the format from the file extension.
+"""
+
+COMPRESSION_EXTENSIONS = {
+    None: '.ndjson',
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst'
+}
+LANDING_EXTENSIONS = ('.json', '.ndjson', '.ndjson.gz', '.ndjson.zst')
+
+def is_landing_file(filename):
+    return filename.endswith(LANDING_EXTENSIONS) and not filename.startswith('.')
+
+def strip_landing_extension(filename):
+    """ File name without its storage extension ('spotify_11102024.ndjson.gz' -> 'spotify_11102024').
+    """
+    for extension in sorted(LANDING_EXTENSIONS, key=len, reverse=True):
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("The zstd storage mode needs the 'zstandard' package (pip install zstandard)")
+
+def open_landing_file(path, mode='rb'):
+    """ Open a landing file in binary mode ('rb' or 'wb'), decompressing or compressing it according to its extension.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    if path.endswith('.zst'):
+        _require_zstandard()
+        raw_file = open(path, mode)
+        if mode.startswith('r'):
+            return zstandard.ZstdDecompressor().stream_reader(raw_file, closefd=True)
+        return zstandard.ZstdCompressor(level=3).stream_writer(raw_file, closefd=True)
+    return open(path, mode)
+
+def read_records(path):
+    """ Return the list of records stored in a landing file (.json, .ndjson, .ndjson.gz or .ndjson.zst).
+    """
+    if path.endswith('.json'):
+        with open(path, 'r') as json_file:
+            return json.load(json_file)
+    with open_landing_file(path, 'rb') as binary_file:
+        return [json.loads(line) for line in io.TextIOWrapper(binary_file, encoding='utf-8') if line.strip()]
+
+def write_records(records, path, compression=None):
+    """ Write records as NDJSON, compressed with `compression` (None, 'gzip' or 'zstd').
+    `path` must end with the matching extension (see COMPRESSION_EXTENSIONS).
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression: {compression} (expected one of {list(COMPRESSION_EXTENSIONS)})")
+    with open_landing_file(path, 'wb') as binary_file:
+        for record in records:
+            binary_file.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
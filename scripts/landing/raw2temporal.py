@@ -1,29 +1,105 @@
+import hashlib
+import json
 import os
 import shutil
+try:
+    import fcntl  # Not available on Windows: reflinks are then skipped
+except ImportError:
+    fcntl = None
 
 """# Raw to Temporal Landing
 Take the data files for Spotify and Ticketmaster in the raw directory and copies them to the temporal landing directory.
+
+A manifest (MANIFEST_FILENAME, in the temporal directory) records the size, modification time and SHA-256 of every file
+already transferred, so unchanged files are not landed again. Files are placed with a reflink (copy-on-write clone) when
+the filesystem allows it, which only writes metadata, and with a byte copy otherwise. Hardlinks are not used: the landed
+file would be the raw file itself (temporal2persistent moves it, keeping the inode), so rewriting a raw file in place
+would change the landed history.
 """
 
+MANIFEST_FILENAME = '.raw2temporal_manifest.json'  # Dotfile: ignored by temporal2persistent
+FICLONE = 0x40049409  # Linux ioctl cloning a whole file (btrfs, XFS, ...)
+
+def file_hash(path, chunk_size=1 << 20):
+    """ SHA-256 of a file, read in chunks of `chunk_size` bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(tempdir_out):
+    manifest_path = os.path.join(tempdir_out, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+def save_manifest(tempdir_out, manifest):
+    manifest_path = os.path.join(tempdir_out, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)  # Never leave a half written manifest
+
+def place_file(source_path, dest_path):
+    """ Place a copy of `source_path` at `dest_path` using the cheapest method available:
+    reflink, then byte copy (with metadata). The destination never shares its data with the source.
+    Returns the method used.
+    """
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+
+    if fcntl is not None:
+        try:
+            with open(source_path, 'rb') as source, open(dest_path, 'wb') as dest:
+                fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+            shutil.copystat(source_path, dest_path)
+            return 'Reflinked'
+        except OSError:
+            os.remove(dest_path)  # Filesystem without reflink support
+
+    shutil.copy2(source_path, dest_path)  # Copy with metadata
+    return 'Copied'
+
 def raw2temporal(rawdir_in, tempdir_out):
     """
     Copy raw data files from the directory where the raw data is stored (rawdir_in)
-    to the temporal directory (tempdir_out).
+    to the temporal directory (tempdir_out), skipping the files already transferred with the same content.
     """
-    
+
     # Ensure the temporal directory exists
     if not os.path.exists(tempdir_out):
         os.makedirs(tempdir_out)
 
-    # Copy each file from the raw_data_path to the tempdir_out directory
+    manifest = load_manifest(tempdir_out)
+    landed_hashes = {entry['sha256'] for entry in manifest.values()}
+
+    # Copy each new or modified file from the raw_data_path to the tempdir_out directory
     for filename in os.listdir(rawdir_in):
         source_path = os.path.join(rawdir_in, filename)
         dest_path = os.path.join(tempdir_out, filename)
-        
-        shutil.copy2(source_path, dest_path)  # Copy with metadata
-        print(f"Copied {source_path} to {dest_path}")
-       
+        stat = os.stat(source_path)
+        entry = manifest.get(filename)
+
+        # Same size and modification time as in the manifest: unchanged, no need to read it
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            print(f"Skipped {source_path} (unchanged)")
+            continue
+
+        sha256 = file_hash(source_path)
+        manifest[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+        if sha256 in landed_hashes:  # Touched, or renamed, but with the same content
+            print(f"Skipped {source_path} (content already transferred)")
+            continue
+
+        method = place_file(source_path, dest_path)
+        landed_hashes.add(sha256)
+        print(f"{method} {source_path} to {dest_path}")
+
+    save_manifest(tempdir_out, manifest)
+
 if __name__ == "__main__":
     rawdir_in = input("Raw directory path (input): ")
     tempdir_out = input("Temporal landing directory path (output): ")
-    raw2temporal(rawdir_in, tempdir_out)
\ No newline at end of file
+    raw2temporal(rawdir_in, tempdir_out)
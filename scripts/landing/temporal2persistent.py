@@ -1,18 +1,42 @@
 from datetime import datetime
 import shutil
 import os
+from landing_files import COMPRESSION_EXTENSIONS, is_landing_file, read_records, strip_landing_extension, write_records
+from landing_catalog import connect_catalog, find_snapshot, next_version, register_snapshot, snapshot_name
+from raw2temporal import file_hash
 
 """# Temporal Landing to Persisten Landing
 Take the data files for Spotify and Ticketmaster in the temporal landing and moves them to the persistent landing applying the necessary transformations.
+
+Files are stored either as they are (JSON) or, with a compression mode, as compressed NDJSON partitioned by source
+and ingestion date (e.g. spotify_source/ingestion_date=11102024/spotify_11102024.ndjson.gz). The landing_files module
+reads both layouts.
 """
 
-def temporal2persistent(tempdir_in, persistdir_out):
+def landed_names(source_dir):
+    """ Names (without extension) of the files already stored in a source directory of the persistent landing.
+    """
+    return {strip_landing_extension(file) for _, _, files in os.walk(source_dir) for file in files if is_landing_file(file)}
+
+def temporal2persistent(tempdir_in, persistdir_out, compression=None):
     """
     Move files from the temporal landing to the persistent landing.
     The function renames each file using its source and ingestion date ("source_DD/MM/YYYY.json").
+    With `compression` ('gzip' or 'zstd'), the records are stored as compressed NDJSON in an ingestion date partition
+    ("source_source/ingestion_date=DDMMYYYY/source_DDMMYYYY.ndjson.gz") and the temporal file is removed.
+    Every landed file is recorded in the landing catalog (see landing_catalog.py); a file with the same content as an
+    already landed snapshot is not landed again, and a second snapshot on the same day gets a version suffix.
     """
+    if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression: {compression} (expected 'gzip' or 'zstd')")
+
+    con = connect_catalog(persistdir_out)
 
     for filename_in in os.listdir(tempdir_in):  # Iterate over files in the temporary directory
+        # Hidden files (e.g. the raw2temporal manifest) stay in the temporal landing
+        if filename_in.startswith('.'):
+            continue
+
         # Define the source and output subdirectory based on file name
         if 'spotify' in filename_in.lower():
             subdir = 'spotify_source'
@@ -21,26 +45,55 @@ def temporal2persistent(tempdir_in, persistdir_out):
         else:
             print(f"Filename_in format unrecognized: {filename_in}")
             continue
+        source = subdir.split('_')[0]
 
-        # Fetch the creation time of the file and format it as DDMMYYYY
+        # Skip the files already landed
         source_path = os.path.join(tempdir_in, filename_in)
-        creation_time = os.path.getctime(source_path)
-        creation_date = datetime.fromtimestamp(creation_time).strftime('%d%m%Y')
-        
-        # Format the output file name with the creation date
-        filename_out = f"{subdir.split('_')[0]}_{creation_date}.json"
-        
+        sha256 = file_hash(source_path)
+        landed = find_snapshot(con, source, sha256)
+        if landed is not None:
+            os.remove(source_path)
+            print(f"Skipped {source_path} (already landed as {landed[1]}, version {landed[0]})")
+            continue
+
+        # Fetch the creation time of the file and format it as DDMMYYYY
+        creation_time = datetime.fromtimestamp(os.path.getctime(source_path))
+        creation_date = creation_time.strftime('%d%m%Y')
+
+        # Format the output file name with the creation date (and the version if that date was already landed)
+        version = next_version(con)
+        existing_names = landed_names(os.path.join(persistdir_out, subdir))
+        name = snapshot_name(con, source, creation_date, version, taken=lambda name: name in existing_names)
+        if compression is None:
+            filename_out = f"{name}.json"
+            target_dir = os.path.join(persistdir_out, subdir)
+        else:
+            filename_out = f"{name}{COMPRESSION_EXTENSIONS[compression]}"
+            target_dir = os.path.join(persistdir_out, subdir, f"ingestion_date={creation_date}")
+
         # Create the target subdirectory if it doesn't exist
-        target_dir = os.path.join(persistdir_out, subdir)
         if not os.path.exists(target_dir):
             os.makedirs(target_dir)
 
         # Construct the full output path and move the file
         output_path = os.path.join(target_dir, filename_out)
-        shutil.move(source_path, output_path)  # Move the file to the persistent directory
-        print(f"Moved {source_path} to {output_path}")
+        records = read_records(source_path)
+        if compression is None:
+            shutil.move(source_path, output_path)  # Move the file to the persistent directory
+            print(f"Moved {source_path} to {output_path}")
+        else:
+            size_in = os.path.getsize(source_path)
+            write_records(records, output_path, compression)
+            os.remove(source_path)
+            print(f"Compressed {source_path} to {output_path} ({size_in} -> {os.path.getsize(output_path)} bytes)")
+
+        register_snapshot(con, version, source, creation_time, len(records), sha256,
+                          os.path.relpath(output_path, persistdir_out), name)
+
+    con.close()
 
 if __name__ == "__main__":
     tempdir_in = input("Temporal landing directory path (input): ")
     persistdir_out = input("Persistent landing directory path (output): ")
-    temporal2persistent(tempdir_in, persistdir_out)
\ No newline at end of file
+    compression = input("Compression (gzip or zstd, leave empty to keep the JSON files): ").strip() or None
+    temporal2persistent(tempdir_in, persistdir_out, compression)
@@ -0,0 +1,100 @@
+import os
+import shutil
+import duckdb
+
+"""# Zone storage
+Optional Parquet backend for the zones of the pipeline. A zone stored as Parquet is a directory with one dataset
+(directory of Parquet files) per table, partitioned by some columns if requested (Hive layout, e.g.
+spotify/source_date=11102024/data_0.parquet):
+
+    trusted_parquet/
+        spotify/source_date=.../*.parquet
+        ticketmaster/source_date=.../*.parquet
+
+DuckDB scans these datasets directly: only the columns a query uses are read (projection pushdown) and the filters
+skip the partitions and row groups that cannot match (predicate pushdown). Data is handed over between stages as
+DuckDB relations or Arrow tables (relation.arrow(), which needs pyarrow) instead of pandas DataFrames.
+
+A stage can accept both backends with connect_zone(path): a .duckdb file is opened as usual, a Parquet zone directory
+is exposed as views with the same table names. With the Parquet zone storage of step 7 of the app, the trusted zone is
+exported (export_zone) and scanned by trusted2exploit, and the exploitation zone is exported for the sandbox step.
+"""
+
+# Default partition columns of the tables exported to Parquet (only used if the table has these columns)
+DEFAULT_PARTITION_BY = ['source_date']
+
+def is_parquet_zone(path):
+    return os.path.isdir(path)
+
+def zone_tables(zone_dir):
+    """ Names of the tables (datasets) of a Parquet zone.
+    """
+    return sorted(name for name in os.listdir(zone_dir) if os.path.isdir(os.path.join(zone_dir, name)))
+
+def zone_table_sql(zone_dir, table_name):
+    """ SQL scanning a table of a Parquet zone. Partition values are kept as VARCHAR (e.g. source_date '11102024').
+    """
+    pattern = os.path.join(zone_dir, table_name, '**', '*.parquet').replace("'", "''")
+    return f"SELECT * FROM read_parquet('{pattern}', hive_partitioning=true, hive_types_autocast=false)"
+
+def write_zone_table(con, query, zone_dir, table_name, partition_by=None):
+    """ Write the result of `query` (run on `con`) as the Parquet dataset `table_name` of a zone, replacing it.
+    """
+    dataset_dir = os.path.join(zone_dir, table_name)
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    os.makedirs(dataset_dir)
+
+    if partition_by:
+        options = f"FORMAT PARQUET, PARTITION_BY ({', '.join(partition_by)})"
+        target = dataset_dir
+    else:
+        options = "FORMAT PARQUET"
+        target = os.path.join(dataset_dir, 'data_0.parquet')
+    con.execute(f"COPY ({query}) TO '{target}' ({options})")
+
+def export_zone(duckdb_file_path, zone_dir, partition_by=DEFAULT_PARTITION_BY):
+    """ Export every table of a DuckDB database to a Parquet zone, partitioning each table by the `partition_by`
+    columns it has.
+    """
+    con = duckdb.connect(database=duckdb_file_path, read_only=True)
+    for (table_name,) in con.execute("SHOW TABLES").fetchall():
+        columns = [column[0] for column in con.execute(f"DESCRIBE {table_name}").fetchall()]
+        table_partitions = [column for column in partition_by if column in columns]
+        write_zone_table(con, f"SELECT * FROM {table_name}", zone_dir, table_name, table_partitions)
+        print(f"Table {table_name} exported to {os.path.join(zone_dir, table_name)}"
+              + (f" (partitioned by {', '.join(table_partitions)})" if table_partitions else ""))
+    con.close()
+
+def register_zone(con, zone_dir, prefix='', suffix=''):
+    """ Create a temporary view for every table of a Parquet zone in the connection `con`
+    (named prefix + table + suffix), so SQL written for the DuckDB backend runs unchanged.
+    """
+    for table_name in zone_tables(zone_dir):
+        con.execute(f"CREATE OR REPLACE TEMP VIEW {prefix}{table_name}{suffix} AS {zone_table_sql(zone_dir, table_name)}")
+
+def connect_zone(path, read_only=True):
+    """ Open a zone stored either as a DuckDB database (.duckdb file) or as a Parquet zone (directory).
+    """
+    if not is_parquet_zone(path):
+        return duckdb.connect(database=path, read_only=read_only)
+    con = duckdb.connect()
+    register_zone(con, path)
+    return con
+
+def scan_zone_table(con, zone_dir, table_name, columns=None, where=None):
+    """ Lazy DuckDB relation with the `columns` (all by default) of the rows matching the SQL condition `where`
+    of a Parquet zone table. Only those columns, and the partitions / row groups that can match, are read.
+    Use .arrow() on the result for an Arrow table, or keep it as a relation to chain it into other queries.
+    """
+    relation = con.sql(zone_table_sql(zone_dir, table_name))
+    if where:
+        relation = relation.filter(where)
+    if columns:
+        relation = relation.project(', '.join(columns))
+    return relation
+
+if __name__ == "__main__":
+    duckdb_file_path = input("DuckDB database to export (input): ")
+    zone_dir = input("Parquet zone directory (output): ")
+    export_zone(duckdb_file_path, zone_dir)
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import time
+import duckdb
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generic_data_quality'))
+from consistent_formatting import (clean_date_format, clean_date_format_vectorized, clean_location_format,
+                                   clean_location_format_vectorized, clean_price_range_format,
+                                   clean_price_range_format_vectorized, prepare_ticketmaster)
+
+"""# consistent_formatting benchmark
+Compare the row by row ('pandas') and the vectorized implementations of the consistent formatting steps on a
+synthetic TicketMaster table: the events of the formatted zone repeated until `n_events` rows. Every step is timed on
+its own copy of the table and both results are checked to be identical.
+
+Usage (from the repository root):
+    python ./scripts/trusted/benchmark_consistent_formatting.py --events 1000000
+"""
+
+STEPS = {
+    'date': (clean_date_format, clean_date_format_vectorized),
+    'location': (clean_location_format, clean_location_format_vectorized),
+    'price_range': (clean_price_range_format, clean_price_range_format_vectorized),
+}
+
+def build_events(formatted_db_file, n_events):
+    """ TicketMaster events of all the formatted snapshots repeated until `n_events` rows, with the missing values
+    normalized as prepare_ticketmaster does.
+    """
+    con = duckdb.connect(database=formatted_db_file, read_only=True)
+    tables = [name for (name,) in con.execute("SHOW TABLES").fetchall() if name.startswith('ticketmaster')]
+    df = pd.concat([con.execute(f"SELECT * FROM {table}").df() for table in tables], ignore_index=True)
+    con.close()
+
+    df = prepare_ticketmaster(df)
+    return df.iloc[np.arange(n_events) % len(df)].reset_index(drop=True)
+
+def benchmark_consistent_formatting(formatted_db_file, n_events, steps=tuple(STEPS)):
+    events = build_events(formatted_db_file, n_events)
+    print(f"TicketMaster events: {len(events)}")
+
+    for step in steps:
+        results = []
+        for label, function in zip(('pandas', 'vectorized'), STEPS[step]):
+            df = events.copy()
+            start = time.perf_counter()
+            df = function(df)
+            elapsed = time.perf_counter() - start
+            print(f"{step:<12} {label:<10} {elapsed:>8.2f}s  {len(df) / elapsed:>12,.0f} events/s")
+            results.append(df)
+        print(f"{step:<12} same result: {results[0].equals(results[1])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the consistent formatting implementations.")
+    parser.add_argument('--formatted-db', default='./data/formatted/formatted.duckdb', help="Formatted zone the events are taken from")
+    parser.add_argument('--events', type=int, default=1000000, help="Number of events of the synthetic table")
+    parser.add_argument('--steps', nargs='+', choices=list(STEPS), default=list(STEPS), help="Formatting steps to benchmark")
+    args = parser.parse_args()
+
+    benchmark_consistent_formatting(args.formatted_db, args.events, args.steps)
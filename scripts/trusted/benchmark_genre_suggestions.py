@@ -0,0 +1,90 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import duckdb
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generic_data_quality'))
+from genre_suggestions import suggest_genre_corrections
+
+"""# Genre suggestions benchmark
+Time suggest_genre_corrections on a synthetic spotify table with `n_genres` distinct genres: names made of two or
+three words of the trusted genres, a fraction of them being misspelled variants (one edit) of another genre with
+fewer artists. Reports the time and how many of the misspelled variants are suggested back to their genre.
+
+Usage (from the repository root):
+    python ./scripts/trusted/benchmark_genre_suggestions.py --genres 100000
+"""
+
+def misspell(genre, rng):
+    """ One random edit (deletion, insertion, substitution or transposition) of `genre`.
+    """
+    i = rng.randrange(len(genre) - 1)
+    letter = rng.choice('abcdefghijklmnopqrstuvwxyz')
+    edit = rng.choice(['delete', 'insert', 'substitute', 'transpose'])
+    if edit == 'delete':
+        return genre[:i] + genre[i + 1:]
+    if edit == 'insert':
+        return genre[:i] + letter + genre[i:]
+    if edit == 'substitute':
+        return genre[:i] + letter + genre[i + 1:]
+    return genre[:i] + genre[i + 1] + genre[i] + genre[i + 2:]
+
+def build_vocabulary(trusted_db_file, n_genres, misspelled_fraction, seed=0):
+    """ Genres (with their number of artists) and the expected corrections of the misspelled ones.
+    """
+    rng = random.Random(seed)
+    con = duckdb.connect(database=trusted_db_file, read_only=True)
+    words = sorted({word for (genre,) in con.execute("SELECT DISTINCT unnest(genres) FROM spotify").fetchall() for word in genre.split()})
+    con.close()
+
+    n_misspelled = int(n_genres * misspelled_fraction)
+    genres = set()
+    while len(genres) < n_genres - n_misspelled:
+        genres.add(' '.join(rng.sample(words, rng.choice([2, 3]))))
+    artists = {genre: rng.randint(2, 50) for genre in genres}
+
+    expected = {}
+    for genre in rng.sample(sorted(genres), n_misspelled):
+        variant = misspell(genre, rng)
+        if variant not in artists and ' ' in variant.strip():
+            artists[variant] = 1
+            expected[variant] = genre
+    return artists, expected
+
+def benchmark_genre_suggestions(trusted_db_file, n_genres, misspelled_fraction, max_distance):
+    artists, expected = build_vocabulary(trusted_db_file, n_genres, misspelled_fraction)
+    print(f"Distinct genres: {len(artists)} ({len(expected)} misspelled variants)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'trusted.duckdb')
+        # One artist per (genre, artist number), each with a single genre
+        spotify = pd.DataFrame({'genre': list(artists), 'artists': list(artists.values())})
+        con = duckdb.connect(database=db_file)
+        con.execute("CREATE TABLE spotify AS SELECT 'artist ' || i AS artist, [genre] AS genres FROM spotify, range(artists) r(i)")
+        con.close()
+
+        start = time.perf_counter()
+        n_suggestions = suggest_genre_corrections(db_file, max_distance=max_distance)
+        elapsed = time.perf_counter() - start
+
+        con = duckdb.connect(database=db_file, read_only=True)
+        suggestions = dict(con.execute("SELECT genre, suggestion FROM meta.genre_suggestions").fetchall())
+        con.close()
+
+    found = sum(suggestions.get(variant) == genre for variant, genre in expected.items())
+    print(f"suggest_genre_corrections {elapsed:>7.2f}s  {n_suggestions} suggestions")
+    print(f"Misspelled variants suggested back to their genre: {found}/{len(expected)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the genre suggestions on a synthetic vocabulary.")
+    parser.add_argument('--trusted-db', default='./data/trusted/trusted.duckdb', help="Trusted zone the genre words are taken from")
+    parser.add_argument('--genres', type=int, default=100000, help="Number of distinct genres")
+    parser.add_argument('--misspelled', type=float, default=0.01, help="Fraction of misspelled variants")
+    parser.add_argument('--max-distance', type=int, default=1, help="Maximum number of edits of the suggestions")
+    args = parser.parse_args()
+
+    benchmark_genre_suggestions(args.trusted_db, args.genres, args.misspelled, args.max_distance)
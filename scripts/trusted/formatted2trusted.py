@@ -4,14 +4,116 @@ import duckdb
 
 """# Formatted to trusted:
 Homogeneization of different version of data from same source into a single table.
+
+Two engines are available:
+- 'pandas': every formatted table is loaded into a DataFrame and the DataFrames are concatenated.
+- 'sql': the formatted database is attached to the trusted one and the tables are built inside DuckDB with
+  UNION ALL BY NAME (missing columns are filled with NULL, like pd.concat does), so no data goes through Python.
+
+The formatted tables loaded into the trusted tables are recorded in meta.trusted_snapshots, so incremental_trusted
+only appends the tables that are not there yet (including a second snapshot of an already loaded day).
+
+source_date is the day of a snapshot, without its version: a second snapshot of the same day ("spotify_11102024_v7")
+gets the same source_date as the first one ("spotify_11102024"). The trusted tables keep one row per artist and day,
+so the deduplication keeps the Spotify rows of the first snapshot of the day and drops those of the later versions
+(and their TicketMaster events already in the first one).
 """
 
-def formatted2trusted(duckdb_file_path, trusted_dir):
+def table_source_date(table_name):
+    """ Extract the source (either "spotify" or "ticketmaster") and date from the table name
+    (a second snapshot of the same day has a version suffix, e.g. "spotify_11102024_v7", left out of the date).
+    """
+    source, date = table_name.split('_')[:2]
+    return source, date
+
+def formatted_tables(con, database='formatted'):
+    """ Names of the formatted tables of an attached formatted database, in the same order as SHOW TABLES
+    (the meta schema of landing2formatted is left out).
+    """
+    tables = con.execute("""
+        SELECT table_name FROM duckdb_tables()
+        WHERE database_name = ? AND schema_name = 'main'
+        ORDER BY table_name
+    """, [database]).fetchall()
+    return [table_name for (table_name,) in tables]
+
+def record_trusted_snapshots(con, source, table_names, replace=False):
+    """ Record the formatted tables of `source` loaded into the trusted table of that source. With `replace` (the
+    trusted table was rebuilt from `table_names`), the tables recorded before are forgotten.
+    """
+    con.execute("CREATE SCHEMA IF NOT EXISTS meta")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS meta.trusted_snapshots (
+            table_name VARCHAR PRIMARY KEY,
+            source VARCHAR NOT NULL,
+            loaded_at TIMESTAMP NOT NULL
+        )
+    """)
+    if replace:
+        con.execute("DELETE FROM meta.trusted_snapshots WHERE source = ?", [source])
+    if table_names:
+        con.executemany("INSERT OR REPLACE INTO meta.trusted_snapshots VALUES (?, ?, now())",
+                        [[table_name, source] for table_name in table_names])
+
+def union_formatted_tables(con, table_names, schema='main', database='formatted'):
+    """ (Re)create the spotify and ticketmaster tables of `schema` from the formatted tables `table_names`
+    with UNION ALL BY NAME, adding their source_date.
+    """
+    selects = {'spotify': [], 'ticketmaster': []}
+    loaded = {'spotify': [], 'ticketmaster': []}
+    for i, table_name in enumerate(table_names):
+        source, date = table_source_date(table_name)
+        for name in selects:
+            if name in source:
+                # _snapshot and _row keep the rows in the order of pd.concat (tables in order, rows in order)
+                selects[name].append(f"SELECT *, '{date}' AS source_date, {i} AS _snapshot, rowid AS _row FROM {database}.{table_name}")
+                loaded[name].append(table_name)
+
+    for name, label in [('spotify', 'Spotify'), ('ticketmaster', 'TicketMaster')]:
+        if not selects[name]:
+            continue
+        union = '\nUNION ALL BY NAME\n'.join(selects[name])
+        con.execute(f"DROP TABLE IF EXISTS {schema}.{name}") # drop the table if it already existed
+        if schema == 'main':
+            con.execute(f"DROP TABLE IF EXISTS meta.{name}_fingerprints") # the deduplication index no longer matches the table
+            record_trusted_snapshots(con, name, loaded[name], replace=True)
+        con.execute(f"""
+            CREATE TABLE {schema}.{name} AS
+            SELECT * EXCLUDE (_snapshot, _row) FROM ({union}) ORDER BY _snapshot, _row
+        """)
+        n_rows = con.execute(f"SELECT count(*) FROM {schema}.{name}").fetchone()[0]
+        n_columns = len(con.execute(f"DESCRIBE {schema}.{name}").fetchall())
+        print(f"{label} dataset dimensions: {(n_rows, n_columns)}")
+        print(f"{label} datasets homogenized and saved into the DuckDB file.")
+
+def formatted2trusted_sql(duckdb_file_path, trusted_dir):
+    """ Homogenize the formatted tables from the same source inside DuckDB (see the 'sql' engine of formatted2trusted).
+    """
+    # Create the trusted directory if it doesn't exist
+    if not os.path.exists(trusted_dir):
+        os.makedirs(trusted_dir)
+
+    combined_duckdb_path = os.path.join(trusted_dir, 'trusted.duckdb')
+    con = duckdb.connect(database=combined_duckdb_path)
+    con.execute(f"ATTACH '{duckdb_file_path}' AS formatted (READ_ONLY)")
+
+    union_formatted_tables(con, formatted_tables(con))
+
+    con.execute("DETACH formatted")
+    con.close()
+
+def formatted2trusted(duckdb_file_path, trusted_dir, engine='pandas'):
     """ Homogenize .duckdb files from the same source and add timestamps in order to keep track of the version.
+    `engine` is 'pandas' or 'sql' (see above).
     """
+    if engine == 'sql':
+        formatted2trusted_sql(duckdb_file_path, trusted_dir)
+        return
+
     # Initialize empty lists to store all the dataframes for Spotify and TicketMaster found in the formatted zone
     spotify_dfs = []
     ticketmaster_dfs = []
+    loaded = {'spotify': [], 'ticketmaster': []}
 
     # Connect to the DuckDB file
     con = duckdb.connect(database=duckdb_file_path, read_only=True)
@@ -22,7 +124,7 @@ def formatted2trusted(duckdb_file_path, trusted_dir):
         table_name = table[0]  # Extract table name from the result
 
         # Extract the source (either "spotify" or "ticketmaster") and date from the table name
-        source, date = table_name.split('_', 1)         
+        source, date = table_source_date(table_name)
 
         df = con.execute(f"SELECT * FROM {table_name}").df()
 
@@ -32,8 +134,10 @@ def formatted2trusted(duckdb_file_path, trusted_dir):
         # Check if the table is a "spotify" or "ticketmaster" table and append to the respective list
         if 'spotify' in source:
             spotify_dfs.append(df)
+            loaded['spotify'].append(table_name)
         elif 'ticketmaster' in source:
             ticketmaster_dfs.append(df)
+            loaded['ticketmaster'].append(table_name)
 
     # Close the connection after reading
     con.close()
@@ -50,7 +154,9 @@ def formatted2trusted(duckdb_file_path, trusted_dir):
     if spotify_dfs:
         spotify_data = pd.concat(spotify_dfs, ignore_index=True)
         con.execute(f"DROP TABLE IF EXISTS {'spotify'}") # drop the table if it already existed
+        con.execute("DROP TABLE IF EXISTS meta.spotify_fingerprints") # the deduplication index no longer matches the table
         con.execute("CREATE TABLE spotify AS SELECT * FROM spotify_data")
+        record_trusted_snapshots(con, 'spotify', loaded['spotify'], replace=True)
         print(f"Spotify dataset dimensions: {spotify_data.shape}")
         print("Spotify datasets homogenized and saved into the DuckDB file.")
 
@@ -58,7 +164,9 @@ def formatted2trusted(duckdb_file_path, trusted_dir):
     if ticketmaster_dfs:
         ticketmaster_data = pd.concat(ticketmaster_dfs, ignore_index=True)
         con.execute(f"DROP TABLE IF EXISTS {'ticketmaster'}") # drop the table if it already existed
+        con.execute("DROP TABLE IF EXISTS meta.ticketmaster_fingerprints") # the deduplication index no longer matches the table
         con.execute("CREATE TABLE ticketmaster AS SELECT * FROM ticketmaster_data")
+        record_trusted_snapshots(con, 'ticketmaster', loaded['ticketmaster'], replace=True)
         print(f"TicketMaster dataset dimensions: {ticketmaster_data.shape}")
         print("TicketMaster datasets homogenized and saved into the DuckDB file.")
 
@@ -68,4 +176,5 @@ def formatted2trusted(duckdb_file_path, trusted_dir):
 if __name__ == "__main__":
     duckdb_file_path = input("Path to DuckDB file (input): ")
     trustdir_out = input("Trusted directory path (output): ")
-    formatted2trusted(duckdb_file_path, trustdir_out)
+    engine = input("Engine (pandas or sql, leave empty for pandas): ").strip() or 'pandas'
+    formatted2trusted(duckdb_file_path, trustdir_out, engine)
@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 import warnings
 warnings.filterwarnings("ignore")
+from trusted_tables import existing_tables
 
 """# Consistent formatting
 Date, time, location, and price variables will be formatted to unify all entries accross the dataset.
@@ -11,42 +12,17 @@ Date, time, location, and price variables will be formatted to unify all entries
 In this first step, all missing values—represented by variations like 'NA', 'N/A', 'NA/NA', and others—will be combined into a single NA value using the np.nan object.
 """
 
-def quick_data_prep_ticketmaster(db_file):
+def prepare_ticketmaster(df):
     """
-    Specify format for columns and set missing values as NA,
-    then store changes in the DuckDB database.
+    Specify format for columns and set missing values as NA in a TicketMaster DataFrame.
     """
+    df['time'] = pd.to_datetime(df['time'], format='%H:%M:%S', errors='coerce')
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
+    df['location'].replace(['N/A, N/A', 'NA'], np.nan, inplace=True)
+    df['price_range'].replace(to_replace=r'.*N/A.*|.*NA.*', value=np.nan, regex=True, inplace=True)
+    df['venue'].replace(to_replace=r'.*N/A.*|.*NA.*', value=np.nan, regex=True, inplace=True)
 
-    # Connect to DuckDB database
-    conn = duckdb.connect(database=db_file, read_only=False)
-    # Fetch all table names in the database
-    tables = ['spotify', 'ticketmaster']
-
-    # Iterate over each table
-    for table in tables:
-
-        if table == 'ticketmaster':
-            df = conn.execute(f"SELECT * FROM {table}").df()
-
-            # Transformations
-            df['time'] = pd.to_datetime(df['time'], format='%H:%M:%S', errors='coerce')
-            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
-            df['location'].replace(['N/A, N/A', 'NA'], np.nan, inplace=True)
-            df['price_range'].replace(to_replace=r'.*N/A.*|.*NA.*', value=np.nan, regex=True, inplace=True)
-            df['venue'].replace(to_replace=r'.*N/A.*|.*NA.*', value=np.nan, regex=True, inplace=True)
-
-        if table == 'spotify':
-            df = conn.execute(f"SELECT * FROM {table}").df()
-
-            # Set np.nan for empty genres lists
-            df['genres'] = df['genres'].apply(lambda x: 'NA' if len(x) == 0 else x)
-
-        # Drop the existing table and write back the transformed data
-        conn.execute(f"DROP TABLE IF EXISTS {table}")
-        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM df")
-
-    # Close connection
-    conn.close()
+    return df
 
 """### a) Date formatting
 Format dates from 'YYYY-MM-DD' to 'DD-MM-YYYY'. Additionally, the time and date columns will be checked, and any dates beyond the year 2040 will be marked as invalid and set to NA
@@ -65,6 +41,15 @@ def clean_date_format(df):
     df.loc[df['date'].dt.year > 2035, 'date'] = pd.NaT
 
 
+    return df
+
+def clean_date_format_vectorized(df):
+    """ Same result as clean_date_format with a single datetime conversion: the time of the day is dropped with
+    normalize instead of the round trip through 'DD-MM-YYYY' strings. Invalid dates are set to NaT.
+    """
+    dates = pd.to_datetime(df['date'], errors='coerce').dt.normalize()
+    df['date'] = dates.where(dates.dt.year <= 2035)
+
     return df
 
 """### b) Location formatting"""
@@ -90,29 +75,42 @@ def clean_location_format(df):
 
     return df
 
+def clean_location_format_vectorized(df):
+    """ Same result as clean_location_format, splitting the whole column by its last comma at once.
+    """
+    parts = df['location'].str.rsplit(',', n=1, expand=True).reindex(columns=[0, 1])
+    # Locations without a comma cannot be split
+    has_country = parts[1].notna()
+    df['city'] = parts[0].str.strip().where(has_country, np.nan)
+    df['country'] = parts[1].str.strip().where(has_country, np.nan)
+    df.drop(columns=['location'], inplace=True)
+
+    return df
+
 """## c) Price range formatting
 Range price format in EUR and split in columns min_price_EUR and max_price_EUR:
 """
 
+EXCHANGE_RATES = {
+    'EUR': 1.0,    # 1 EUR = 1 EUR
+    'USD': 0.95,   # 1 USD = 0.95 EUR
+    'GBP': 1.16,   # 1 GBP = 1.16 EUR
+    'CAD': 0.69,   # 1 CAD = 0.69 EUR
+    'AED': 0.26,   # 1 AED = 0.26 EUR
+    'AUD': 0.60,   # 1 AUD = 0.60 EUR
+    'NZD': 0.57,   # 1 NZD = 0.57 EUR
+    'CZK': 0.04,   # 1 CZK = 0.04 EUR
+    'MXN': 0.048,  # 1 MXN = 0.048 EUR
+    'PLN': 0.22,   # 1 PLN = 0.22 EUR
+    'DKK': 0.13,   # 1 DKK = 0.13 EUR
+    'NOK': 0.088,  # 1 NOK = 0.088 EUR
+    'SEK': 0.086,  # 1 SEK = 0.086 EUR
+    'ZAR': 0.049   # 1 ZAR = 0.049 EUR
+    }
+
 def process_price_range(price_range):
     if pd.isna(price_range):  # Leave NaNs as they are
         return (np.nan, np.nan)
-    EXCHANGE_RATES = {
-        'EUR': 1.0,    # 1 EUR = 1 EUR
-        'USD': 0.95,   # 1 USD = 0.95 EUR
-        'GBP': 1.16,   # 1 GBP = 1.16 EUR
-        'CAD': 0.69,   # 1 CAD = 0.69 EUR
-        'AED': 0.26,   # 1 AED = 0.26 EUR
-        'AUD': 0.60,   # 1 AUD = 0.60 EUR
-        'NZD': 0.57,   # 1 NZD = 0.57 EUR
-        'CZK': 0.04,   # 1 CZK = 0.04 EUR
-        'MXN': 0.048,  # 1 MXN = 0.048 EUR
-        'PLN': 0.22,   # 1 PLN = 0.22 EUR
-        'DKK': 0.13,   # 1 DKK = 0.13 EUR
-        'NOK': 0.088,  # 1 NOK = 0.088 EUR
-        'SEK': 0.086,  # 1 SEK = 0.086 EUR
-        'ZAR': 0.049   # 1 ZAR = 0.049 EUR
-        }
 
     # Split the price and extract currency
     # Split the range part and currency part (e.g., '32.5-32.5 EUR' -> ['32.5', '32.5'], 'EUR')
@@ -146,23 +144,60 @@ def clean_price_range_format(df):
   df.drop(columns=['price_range'], inplace=True)
   return df
 
-def consistent_formatting(db_file):
-    quick_data_prep_ticketmaster(db_file)
+def clean_price_range_format_vectorized(df):
+    """ Same result as clean_price_range_format, computed on whole columns: one regex extraction of the
+    'min-max CURRENCY' parts, a lookup of the currency in EXCHANGE_RATES and NumPy arithmetic.
+    Malformed ranges (which make process_price_range fail) are set to NaN instead.
+    """
+    # Same split as process_price_range: currency after the last space, prices around the only '-'
+    parts = df['price_range'].str.extract(r'^([^-]*)-([^-]*) ([^ ]*)$')
+    min_price = pd.to_numeric(parts[0], errors='coerce').to_numpy(dtype=float)
+    max_price = pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype=float)
+    rate = parts[2].map(EXCHANGE_RATES).to_numpy(dtype=float)  # NaN for unknown currencies
+
+    # A range is only valid if both prices and the currency are
+    valid = ~(np.isnan(min_price) | np.isnan(max_price) | np.isnan(rate))
+    df['min_price_EUR'] = np.where(valid, min_price * rate, np.nan)
+    df['max_price_EUR'] = np.where(valid, max_price * rate, np.nan)
+    df.drop(columns=['price_range'], inplace=True)
+    return df
 
+# Formatting functions of each engine, in the order they are applied
+FORMATTING_STEPS = {
+    'pandas': (clean_date_format, clean_location_format, clean_price_range_format),
+    'vectorized': (clean_date_format_vectorized, clean_location_format_vectorized, clean_price_range_format_vectorized),
+}
+
+def consistent_formatting(db_file, schema='main', engine='pandas'):
+    """ Format the tables of `schema` (e.g. 'staging' to only process a new batch).
+    `engine` is 'pandas' (row by row functions) or 'vectorized' (whole column operations, same result).
+    The ticketmaster table is read once, prepared (see prepare_ticketmaster) and formatted in memory, and written back
+    once in a single transaction. The spotify table needs no formatting and is not rewritten.
+    """
     conn = duckdb.connect(database=db_file, read_only=False)
-    df_ticket = conn.execute(f"SELECT * FROM {'ticketmaster'}").df()
+    if 'ticketmaster' not in existing_tables(conn, schema):
+        conn.close()
+        return
+    df_ticket = conn.execute(f"SELECT * FROM {schema}.ticketmaster").df()
 
     # Clean columns
-    df_ticket = clean_date_format(df_ticket)
-    df_ticket = clean_location_format(df_ticket)
-    df_ticket = clean_price_range_format(df_ticket)
+    df_ticket = prepare_ticketmaster(df_ticket)
+    for clean_column in FORMATTING_STEPS[engine]:
+        df_ticket = clean_column(df_ticket)
     print(df_ticket.head())
 
     # Save changes in the database
-    conn.execute(f"DROP TABLE IF EXISTS {'ticketmaster'}")
-    conn.execute(f"CREATE TABLE {'ticketmaster'} AS SELECT * FROM df_ticket")
-    conn.close()
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(f"CREATE OR REPLACE TABLE {schema}.ticketmaster AS SELECT * FROM df_ticket")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     duckdb_file_path = input("Input DuckDB database (trusted): ")
-    consistent_formatting(duckdb_file_path)    
\ No newline at end of file
+    engine = input("Engine (pandas or vectorized, leave empty for pandas): ").strip() or 'pandas'
+    consistent_formatting(duckdb_file_path, engine=engine)    
\ No newline at end of file
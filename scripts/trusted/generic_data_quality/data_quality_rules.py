@@ -0,0 +1,184 @@
+import time
+import duckdb
+from consistent_formatting import EXCHANGE_RATES
+from deduplication import drop_fingerprints, duplicate_key_columns
+from misspellings import CURRENT_CORRECTIONS, ensure_genre_corrections
+from trusted_tables import existing_tables
+
+"""# Data quality rules
+The data quality steps of the trusted zone (deduplication, consistent formatting and misspellings) declared once as
+rules and compiled into a single SQL query per table, instead of three scripts that each load the table into a
+DataFrame and rewrite it. Every rule is a step of the query (a CTE over the previous one):
+
+- 'deduplicate': keep the first row (in table order) of each group of duplicates, with the keys of
+  duplicate_key_columns (see deduplication.py).
+- 'parse_timestamp': parse VARCHAR columns with a strptime format into TIMESTAMP_NS, like pd.to_datetime with
+  errors='coerce' (unparsable values and values out of the nanosecond range become NULL). Columns that already are
+  timestamps are only cast.
+- 'replace': replace columns by SQL expressions of the row.
+- 'derive': replace a column (`source`) by new columns computed from it.
+- 'map_list': map the elements of a list column through a (key, value) query, e.g. the genre corrections.
+
+Each table is read once and written once (CREATE OR REPLACE), all the tables in one transaction. With profile=True,
+every rule is materialized on its own instead, to report its time and the rows it removed or changed.
+"""
+
+def missing_if(column, pattern):
+    """ SQL expression setting `column` to NULL when it matches `pattern` (like pandas replace with regex=True).
+    """
+    return f"CASE WHEN regexp_matches({column}, '{pattern}') THEN NULL ELSE {column} END"
+
+# Last comma of the location: city before it, country after it (NULL for both without a comma)
+LOCATION_PART = "CASE WHEN contains(location, ',') THEN trim(regexp_extract(location, '^(.*),([^,]*)$', {group})) END"
+
+# 'min-max CURRENCY' price ranges, converted to EUR (NULL for malformed ranges and unknown currencies)
+EXCHANGE_RATE = "CASE regexp_extract(price_range, '^([^-]*)-([^-]*) ([^ ]*)$', 3) " + ' '.join(
+    f"WHEN '{currency}' THEN {rate!r}::DOUBLE" for currency, rate in EXCHANGE_RATES.items()) + " END"
+PRICE_EUR = "TRY_CAST(regexp_extract(price_range, '^([^-]*)-([^-]*) ([^ ]*)$', {group}) AS DOUBLE) * " + EXCHANGE_RATE
+
+DATA_QUALITY_RULES = {
+    'ticketmaster': [
+        {'name': 'deduplication', 'kind': 'deduplicate'},
+        {'name': 'missing values', 'kind': 'replace', 'columns': {
+            'location': "CASE WHEN location IN ('N/A, N/A', 'NA') THEN NULL ELSE location END",
+            'price_range': missing_if('price_range', 'N/A|NA'),
+            'venue': missing_if('venue', 'N/A|NA'),
+        }},
+        {'name': 'date and time parsing', 'kind': 'parse_timestamp', 'columns': {
+            'date': '%Y-%m-%d',
+            'time': '%H:%M:%S',
+        }},
+        {'name': 'date cut-off', 'kind': 'replace', 'columns': {
+            'date': "CASE WHEN year(date) <= 2035 THEN date_trunc('day', date)::TIMESTAMP_NS END",
+        }},
+        {'name': 'location split', 'kind': 'derive', 'source': 'location', 'columns': {
+            'city': LOCATION_PART.format(group=1),
+            'country': LOCATION_PART.format(group=2),
+        }},
+        {'name': 'currency conversion', 'kind': 'derive', 'source': 'price_range', 'columns': {
+            'min_price_EUR': f"CASE WHEN ({PRICE_EUR.format(group=2)}) IS NOT NULL THEN {PRICE_EUR.format(group=1)} END",
+            'max_price_EUR': f"CASE WHEN ({PRICE_EUR.format(group=1)}) IS NOT NULL THEN {PRICE_EUR.format(group=2)} END",
+        }},
+    ],
+    'spotify': [
+        {'name': 'deduplication', 'kind': 'deduplicate'},
+        {'name': 'genre corrections', 'kind': 'map_list', 'column': 'genres', 'mapping': CURRENT_CORRECTIONS},
+    ],
+}
+
+# Range of the TIMESTAMP_NS type (the one of pandas datetimes)
+TIMESTAMP_NS_RANGE = "BETWEEN TIMESTAMP '1677-09-22' AND TIMESTAMP '2262-04-11'"
+
+def parse_timestamp(column, column_type, timestamp_format):
+    """ SQL expression parsing `column` (of type `column_type`) into a TIMESTAMP_NS (see 'parse_timestamp').
+    """
+    parsed = f"try_strptime(\"{column}\", '{timestamp_format}')" if column_type == 'VARCHAR' else f'"{column}"::TIMESTAMP'
+    return f"CASE WHEN {parsed} {TIMESTAMP_NS_RANGE} THEN {parsed}::TIMESTAMP_NS END"
+
+def compile_rule(conn, schema, table, rule, previous):
+    """ SELECT statement applying `rule` to the rows of `previous` (a CTE or table with a _row column, the position
+    of the row in the original table).
+    """
+    if rule['kind'] == 'deduplicate':
+        key = ', '.join(f'"{column}"' for column in duplicate_key_columns(conn, schema, table))
+        return f"SELECT * FROM {previous} QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY _row) = 1"
+    if rule['kind'] == 'parse_timestamp':
+        column_types = {column: column_type for column, column_type, *_ in conn.execute(f"DESCRIBE {schema}.{table}").fetchall()}
+        replaced = ', '.join(f'{parse_timestamp(column, column_types[column], timestamp_format)} AS "{column}"'
+                             for column, timestamp_format in rule['columns'].items())
+        return f"SELECT * REPLACE ({replaced}) FROM {previous}"
+    if rule['kind'] == 'replace':
+        replaced = ', '.join(f'{expression} AS "{column}"' for column, expression in rule['columns'].items())
+        return f"SELECT * REPLACE ({replaced}) FROM {previous}"
+    if rule['kind'] == 'derive':
+        derived = ', '.join(f'{expression} AS "{column}"' for column, expression in rule['columns'].items())
+        return f'SELECT * EXCLUDE ("{rule["source"]}"), {derived} FROM {previous}'
+    if rule['kind'] == 'map_list':
+        column = rule['column']
+        return f"""
+            SELECT p.* REPLACE (list_transform(p."{column}", element -> coalesce(m.mapping[element], element)) AS "{column}")
+            FROM {previous} p, (SELECT map(list(key), list(value)) AS mapping FROM ({rule['mapping']}) t(key, value)) m
+        """
+    raise ValueError(f"Unknown rule kind: {rule['kind']}")
+
+def compile_rules(conn, schema, table, rules):
+    """ Single query applying all the `rules` of a table, keeping the order of its rows.
+    """
+    steps = [f"step_0 AS (SELECT *, rowid AS _row FROM {schema}.{table})"]
+    for i, rule in enumerate(rules, start=1):
+        steps.append(f"step_{i} AS ({compile_rule(conn, schema, table, rule, f'step_{i - 1}')})")
+    return f"WITH {', '.join(steps)} SELECT * EXCLUDE (_row) FROM step_{len(rules)} ORDER BY _row"
+
+def changed_rows(conn, rule, previous, current):
+    """ Number of rows of `current` whose columns touched by `rule` differ from `previous` (None for rules that only
+    remove rows). Values are compared as text, since a rule may change the type of a column.
+    """
+    if rule['kind'] == 'deduplicate':
+        return None
+    if rule['kind'] == 'map_list':
+        condition = f'p."{rule["column"]}"::VARCHAR IS DISTINCT FROM c."{rule["column"]}"::VARCHAR'
+    elif rule['kind'] == 'derive':
+        condition = f'p."{rule["source"]}" IS NOT NULL'
+    else:
+        condition = ' OR '.join(f'p."{column}"::VARCHAR IS DISTINCT FROM c."{column}"::VARCHAR' for column in rule['columns'])
+    return conn.execute(f"SELECT count(*) FROM {previous} p JOIN {current} c USING (_row) WHERE {condition}").fetchone()[0]
+
+def profile_rules(conn, schema, table, rules, output):
+    """ Apply the `rules` of a table one by one (each one materialized as a temporary table), appending the time and
+    row counts of each rule to `output`.
+    """
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE step_0 AS SELECT *, rowid AS _row FROM {schema}.{table}")
+    n_rows = conn.execute("SELECT count(*) FROM step_0").fetchone()[0]
+    for i, rule in enumerate(rules, start=1):
+        start = time.perf_counter()
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE step_{i} AS {compile_rule(conn, schema, table, rule, f'step_{i - 1}')}")
+        elapsed = time.perf_counter() - start
+        n_output = conn.execute(f"SELECT count(*) FROM step_{i}").fetchone()[0]
+        changed = changed_rows(conn, rule, f'step_{i - 1}', f'step_{i}')
+        output.append(f"{table} | {rule['name']}: {n_rows} -> {n_output} rows"
+                      + (f", {changed} changed" if changed is not None else '') + f" ({elapsed:.3f}s)")
+        n_rows = n_output
+    conn.execute(f"CREATE OR REPLACE TABLE {schema}.{table} AS SELECT * EXCLUDE (_row) FROM step_{len(rules)} ORDER BY _row")
+    for i in range(len(rules) + 1):
+        conn.execute(f"DROP TABLE step_{i}")
+
+def data_quality_rules(db_file, schema='main', rules=DATA_QUALITY_RULES, profile=False):
+    """ Apply the data quality `rules` to the tables of `schema` (e.g. 'staging' to only process a new batch);
+    missing tables are skipped. Returns the output messages (time and rows of each table, or of each rule with
+    `profile`).
+
+    The rules replace running deduplication, consistent_formatting and misspellings, with the same result. When the
+    trusted tables themselves are deduplicated, the fingerprint index of deduplication.py is dropped, since it is not
+    maintained here (an incremental run then filters the events already in the trusted zone when publishing).
+    """
+    output = []
+    conn = duckdb.connect(database=db_file, read_only=False)
+    ensure_genre_corrections(conn)
+    tables = [table for table in rules if table in existing_tables(conn, schema)]
+
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        for table in tables:
+            start = time.perf_counter()
+            if profile:
+                profile_rules(conn, schema, table, rules[table], output)
+            else:
+                conn.execute(f"CREATE OR REPLACE TABLE {schema}.{table} AS {compile_rules(conn, schema, table, rules[table])}")
+            n_rows = conn.execute(f"SELECT count(*) FROM {schema}.{table}").fetchone()[0]
+            output.append(f"{table}: {n_rows} rows after the data quality rules ({time.perf_counter() - start:.3f}s)")
+            if schema == 'main' and any(rule['kind'] == 'deduplicate' for rule in rules[table]):
+                drop_fingerprints(conn, table)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return output
+
+if __name__ == "__main__":
+    duckdb_file_path = input("Input DuckDB database (trusted): ")
+    profile = input("Report the time and rows of each rule (y/n, leave empty for n): ").strip().lower() == 'y'
+    for message in data_quality_rules(duckdb_file_path, profile=profile):
+        print(message)
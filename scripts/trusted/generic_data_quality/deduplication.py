@@ -1,6 +1,126 @@
 import duckdb
+from trusted_tables import existing_tables, table_exists
 
-def deduplication(db_file):
+"""# Deduplication
+With the 'index' engine, a persisted index of 128-bit row fingerprints (md5 of the duplicate key columns) is kept
+for each source in the meta schema (meta.ticketmaster_fingerprints, meta.spotify_fingerprints):
+- Deduplicating the trusted tables themselves (schema 'main') removes the duplicates and rebuilds the index.
+- Deduplicating a new batch (e.g. schema 'staging') removes the rows of the batch already in the index (anti-join)
+  and the duplicates within the batch, so the cost depends on the batch size, not on the history. The fingerprints
+  of the batch are left in <schema>.<table>_fingerprints, to be added to the index when the batch is published
+  (see publish_fingerprints).
+The key columns the index was built from are recorded in meta.fingerprint_keys, and the index is only used for a batch
+with the same key columns.
+"""
+
+def duplicate_key_columns(conn, schema, table):
+    """ Columns identifying duplicates in a table (see deduplication). Spotify keeps one row per artist and source_date,
+    so of two snapshots of the same day only the first one is kept (see formatted2trusted.py).
+    """
+    if table == 'ticketmaster':
+        return [column[0] for column in conn.execute(f"DESCRIBE {schema}.{table}").fetchall() if column[0] != 'source_date']
+    return ['artist', 'source_date']
+
+def deduplicate_table_sql(conn, schema, table):
+    """ Remove the duplicates of a table inside DuckDB, keeping the first row (in table order) of each group of
+    duplicates, like drop_duplicates does. Only the duplicate rows are deleted: the table is not rewritten.
+    Returns the shape of the deduplicated table.
+    """
+    key = ', '.join(f'"{column}"' for column in duplicate_key_columns(conn, schema, table))
+    conn.execute(f"""
+        DELETE FROM {schema}.{table} WHERE rowid IN (
+            SELECT rowid FROM {schema}.{table}
+            QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY rowid) > 1
+        )
+    """)
+    n_rows = conn.execute(f"SELECT count(*) FROM {schema}.{table}").fetchone()[0]
+    n_columns = len(conn.execute(f"DESCRIBE {schema}.{table}").fetchall())
+    return (n_rows, n_columns)
+
+def fingerprint_sql(columns):
+    """ SQL expression of the 128-bit fingerprint of the `columns` of a row (NULLs included).
+    """
+    fields = ', '.join(f'"{column}" := "{column}"' for column in columns)
+    return f"md5_number(to_json(struct_pack({fields})))"
+
+def index_key_columns(conn, table):
+    """ Columns fingerprinted in the index of a source (None if it has no index).
+    """
+    if not table_exists(conn, 'meta', f"{table}_fingerprints") or not table_exists(conn, 'meta', 'fingerprint_keys'):
+        return None
+    row = conn.execute("SELECT key_columns FROM meta.fingerprint_keys WHERE table_name = ?", [table]).fetchone()
+    return row[0] if row is not None else None
+
+def set_index_key_columns(conn, table, columns):
+    conn.execute("CREATE SCHEMA IF NOT EXISTS meta")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta.fingerprint_keys (table_name VARCHAR PRIMARY KEY, key_columns VARCHAR[])")
+    conn.execute("INSERT OR REPLACE INTO meta.fingerprint_keys VALUES (?, ?)", [table, columns])
+
+def deduplicate_table_index(conn, schema, table):
+    """ Remove the duplicates of a table using the fingerprint index of its source (see the module docstring).
+    The index records the columns it was built from (meta.fingerprint_keys): a batch with other duplicate key columns
+    (e.g. an index built from trusted tables that were already formatted) is only deduplicated within itself.
+    Returns the shape of the deduplicated table.
+    """
+    key_columns = duplicate_key_columns(conn, schema, table)
+    fingerprint = fingerprint_sql(key_columns)
+    index = f"meta.{table}_fingerprints"
+    conn.execute("CREATE SCHEMA IF NOT EXISTS meta")
+
+    if schema == 'main':
+        # Whole table: deduplicate it and rebuild the index from scratch
+        shape = deduplicate_table_sql(conn, schema, table)
+        conn.execute(f"CREATE OR REPLACE TABLE {index} AS SELECT DISTINCT {fingerprint} AS fingerprint FROM main.{table}")
+        set_index_key_columns(conn, table, key_columns)
+        return shape
+
+    # New batch. The index can only be used if it was built with the trusted table, on the same columns as the batch
+    # (or there is no trusted table yet); otherwise the batch is only deduplicated within itself
+    matching_index = index_key_columns(conn, table) == key_columns
+    use_index = matching_index or not table_exists(conn, 'main', table)
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE batch_fingerprints AS SELECT rowid AS row_id, {fingerprint} AS fingerprint FROM {schema}.{table}")
+    already_indexed = ""
+    if matching_index:
+        already_indexed = f"UNION ALL SELECT row_id FROM batch_fingerprints WHERE fingerprint IN (SELECT fingerprint FROM {index})"
+    conn.execute(f"""
+        DELETE FROM {schema}.{table} WHERE rowid IN (
+            SELECT row_id FROM batch_fingerprints
+            QUALIFY row_number() OVER (PARTITION BY fingerprint ORDER BY row_id) > 1
+            {already_indexed}
+        )
+    """)
+    if use_index:
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE {schema}.{table}_fingerprints AS
+            SELECT DISTINCT fingerprint FROM batch_fingerprints WHERE row_id IN (SELECT rowid FROM {schema}.{table})
+        """)
+        set_index_key_columns(conn, table, key_columns)
+    conn.execute("DROP TABLE batch_fingerprints")
+
+    n_rows = conn.execute(f"SELECT count(*) FROM {schema}.{table}").fetchone()[0]
+    n_columns = len(conn.execute(f"DESCRIBE {schema}.{table}").fetchall())
+    return (n_rows, n_columns)
+
+def publish_fingerprints(conn, schema, table):
+    """ Add the fingerprints of a published batch (left by deduplicate_table_index) to the index of its source.
+    Returns whether the batch had fingerprints (i.e. it was deduplicated against the index).
+    """
+    if not table_exists(conn, schema, f"{table}_fingerprints"):
+        return False
+    conn.execute("CREATE SCHEMA IF NOT EXISTS meta")
+    conn.execute(f"CREATE TABLE IF NOT EXISTS meta.{table}_fingerprints (fingerprint UHUGEINT)")
+    conn.execute(f"INSERT INTO meta.{table}_fingerprints SELECT fingerprint FROM {schema}.{table}_fingerprints")
+    conn.execute(f"DROP TABLE {schema}.{table}_fingerprints")
+    return True
+
+def drop_fingerprints(conn, table):
+    """ Drop the fingerprint index of a source (when its trusted table is rebuilt without it).
+    """
+    conn.execute(f"DROP TABLE IF EXISTS meta.{table}_fingerprints")
+    if table_exists(conn, 'meta', 'fingerprint_keys'):
+        conn.execute("DELETE FROM meta.fingerprint_keys WHERE table_name = ?", [table])
+
+def deduplication(db_file, schema='main', engine='pandas'):
     """
     Removes duplicates from the tables 'ticketmaster' and 'spotify', with a different deduplication logic for each table.
 
@@ -12,6 +132,10 @@ def deduplication(db_file):
       addressing accidental duplicates from the same data version. Duplicates between different `source_date` 
       entries are kept, as they represent the same artist data collected on different dates, 
       which is useful for tracking changes over time.
+
+    `schema` is the schema holding the tables (e.g. 'staging' to only process a new batch); missing tables are skipped.
+    `engine` is 'pandas' (drop_duplicates on DataFrames), 'sql' (window function inside DuckDB, see deduplicate_table_sql)
+    or 'index' (persisted fingerprint index, see deduplicate_table_index).
     """
     # List to store the output messages in order to print them later
     output = []
@@ -22,9 +146,20 @@ def deduplication(db_file):
     # Table names and ignore column
     tables = ['ticketmaster', 'spotify']
     
+    schema_tables = existing_tables(conn, schema)
+
     for table in tables:
+        if table not in schema_tables:
+            continue
+
+        if engine in ('sql', 'index'):
+            shape = deduplicate_table_sql(conn, schema, table) if engine == 'sql' else deduplicate_table_index(conn, schema, table)
+            label = 'TicketMaster' if table == 'ticketmaster' else 'Spotify'
+            output.append(f"{label} dataset dimensions after deduplication: {shape}")
+            continue
+
         # Load table into a DataFrame
-        df = conn.execute(f"SELECT * FROM {table}").df()
+        df = conn.execute(f"SELECT * FROM {schema}.{table}").df()
         
         # Define the subset of columns for deduplication
         if table == 'ticketmaster':
@@ -37,8 +172,8 @@ def deduplication(db_file):
             output.append(f"Spotify dataset dimensions after deduplication: {df_deduplicated.shape}")
         
         # Save the deduplicated DataFrame back to DuckDB
-        conn.execute(f"DROP TABLE IF EXISTS {table}")
-        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM df_deduplicated")
+        conn.execute(f"DROP TABLE IF EXISTS {schema}.{table}")
+        conn.execute(f"CREATE TABLE {schema}.{table} AS SELECT * FROM df_deduplicated")
 
     # Close the connection
     conn.close()
@@ -48,6 +183,7 @@ def deduplication(db_file):
 # deduplication('/Users/evamartin/Desktop/MDS/curs1/ADSDB_copia/data/probando_trusted/trusted.duckdb')
 if __name__ == "__main__":
     duckdb_file_path = input("Path to DuckDB file (input): ")
-    out = deduplication(duckdb_file_path)
+    engine = input("Engine (pandas, sql or index, leave empty for pandas): ").strip() or 'pandas'
+    out = deduplication(duckdb_file_path, engine=engine)
     for message in out:
         print(message)
\ No newline at end of file
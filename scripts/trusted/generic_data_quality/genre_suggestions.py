@@ -0,0 +1,103 @@
+import duckdb
+from misspellings import CURRENT_CORRECTIONS, add_genre_corrections, ensure_genre_corrections
+
+"""# Misspelling suggestions
+Propose new genre corrections from the genre vocabulary of the spotify table, instead of finding them by hand.
+
+Comparing every pair of genres is quadratic in the vocabulary, so candidate pairs come from a deletion index
+(as in SymSpell): every genre is stored with all the strings obtained by deleting up to `max_distance` of its
+characters, and two genres are only compared if they share one of these strings. Any two genres within `max_distance`
+edits (insertions, deletions, substitutions or transpositions) share one, so no pair is missed, while the join of the
+index only pairs genres that are already close: the cost grows with the size of the index, not with the square of the
+vocabulary. The candidates are then checked with the Damerau-Levenshtein distance, and each genre is suggested to be
+merged into its closest candidate with more artists (the most common spelling wins).
+
+The suggestions are stored in meta.genre_suggestions to be reviewed; the accepted ones become a new version of
+meta.genre_corrections (see accept_genre_suggestions).
+"""
+
+def build_deletion_index(conn, schema, max_distance):
+    """ Distinct genres of the spotify table of `schema` with their number of artists (genre_vocabulary) and the
+    strings obtained by deleting up to `max_distance` characters of each of them (genre_deletions), as temporary tables.
+    """
+    conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE genre_vocabulary AS
+        SELECT genre, count(*) AS artists
+        FROM (SELECT unnest(genres) AS genre FROM {schema}.spotify)
+        WHERE genre IS NOT NULL AND genre <> ''
+        GROUP BY genre
+    """)
+    conn.execute("CREATE OR REPLACE TEMP TABLE genre_deletions AS SELECT genre, genre AS variant, 0 AS deletions FROM genre_vocabulary")
+    for deletions in range(1, max_distance + 1):
+        # Delete each character of the variants of the previous level
+        conn.execute(f"""
+            INSERT INTO genre_deletions
+            SELECT DISTINCT genre, unnest(list_transform(range(1, length(variant) + 1),
+                                                         i -> substring(variant, 1, i - 1) || substring(variant, i + 1))), {deletions}
+            FROM genre_deletions WHERE deletions = {deletions - 1}
+        """)
+
+def suggest_genre_corrections(db_file, schema='main', max_distance=1, max_relative_distance=0.25):
+    """ Store in meta.genre_suggestions the suggested corrections of the genres of the spotify table: pairs of genres
+    within `max_distance` edits (and `max_relative_distance` of the length of the genre), from the rarer genre to the
+    more common one. Genres that already have a correction are skipped.
+    Returns the number of suggestions.
+    """
+    conn = duckdb.connect(database=db_file, read_only=False)
+    ensure_genre_corrections(conn)
+    build_deletion_index(conn, schema, max_distance)
+
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE meta.genre_suggestions AS
+        WITH candidates AS (
+            SELECT DISTINCT a.genre AS genre, b.genre AS other
+            FROM genre_deletions a JOIN genre_deletions b USING (variant)
+            WHERE a.genre < b.genre
+        ), pairs AS (
+            SELECT genre, other, damerau_levenshtein(genre, other) AS distance
+            FROM candidates
+        ), directed AS (
+            -- The genre with fewer artists (or the longer name on ties) is corrected into the other one
+            SELECT CASE WHEN rarer THEN genre ELSE other END AS genre, CASE WHEN rarer THEN other ELSE genre END AS suggestion, distance
+            FROM (
+                SELECT p.*, va.artists < vb.artists OR (va.artists = vb.artists AND length(p.genre) > length(p.other)) AS rarer
+                FROM pairs p
+                JOIN genre_vocabulary va ON va.genre = p.genre
+                JOIN genre_vocabulary vb ON vb.genre = p.other
+                WHERE p.distance <= {int(max_distance)}
+                  AND p.distance <= {float(max_relative_distance)} * greatest(length(p.genre), length(p.other))
+            )
+        )
+        SELECT d.genre, d.suggestion, d.distance, g.artists AS genre_artists, s.artists AS suggestion_artists,
+               current_timestamp AS created_at
+        FROM directed d
+        JOIN genre_vocabulary g ON g.genre = d.genre
+        JOIN genre_vocabulary s ON s.genre = d.suggestion
+        WHERE d.genre NOT IN (SELECT genre FROM ({CURRENT_CORRECTIONS}))
+        QUALIFY row_number() OVER (PARTITION BY d.genre ORDER BY d.distance, s.artists DESC, d.suggestion) = 1
+        ORDER BY d.genre
+    """)
+    n_suggestions = conn.execute("SELECT count(*) FROM meta.genre_suggestions").fetchone()[0]
+
+    conn.execute("DROP TABLE genre_deletions")
+    conn.execute("DROP TABLE genre_vocabulary")
+    conn.close()
+    return n_suggestions
+
+def accept_genre_suggestions(db_file, genres=None):
+    """ Add the suggestions of meta.genre_suggestions (only those of `genres` if given) to the genre corrections,
+    as a new version. Returns the version number, or None if there was nothing to add.
+    """
+    conn = duckdb.connect(database=db_file, read_only=True)
+    accepted = dict(conn.execute("SELECT genre, suggestion FROM meta.genre_suggestions").fetchall())
+    conn.close()
+    if genres is not None:
+        accepted = {genre: suggestion for genre, suggestion in accepted.items() if genre in genres}
+    if not accepted:
+        return None
+    return add_genre_corrections(db_file, accepted)
+
+if __name__ == "__main__":
+    duckdb_file_path = input("Input DuckDB database (trusted): ")
+    n_suggestions = suggest_genre_corrections(duckdb_file_path)
+    print(f"{n_suggestions} suggested genre corrections stored in meta.genre_suggestions")
@@ -2,15 +2,20 @@ import pandas as pd
 from collections import Counter
 import duckdb
 import re
+from trusted_tables import table_exists
 
 """# Misspellings correction
 Find and fix misspellings or variations in the genre column to make sure same genres have a consistent label.
+The `genres` column is a list (VARCHAR[]) from the formatted zone on, an artist without genres having an empty list.
 """
 
 def clean_and_split_genres(df):
     """ Correctly split `genres` column.
+    Lists are kept as they are; genres stored as the string of a list (older trusted zones) are parsed.
     """
     def split_genres(entry):
+        if not isinstance(entry, str):
+            return list(entry)
         if entry == "NA":
             return []
         return re.findall(r"'(.*?)'", entry)
@@ -21,6 +26,9 @@ def clean_and_split_genres(df):
 
 
 """ Manual corrections
+The corrections are kept in the meta.genre_corrections table of the trusted database (genre, correction, version),
+seeded with the dictionary below as version 1. New versions can add or override corrections without changing the
+code (see add_genre_corrections): the correction of a genre is the one of its latest version.
 """
 
 corrections = {
@@ -38,7 +46,7 @@ corrections = {
     'k-pop boy group': 'k-pop'
 }
 
-def correct_genres(df):
+def correct_genres(df, corrections=corrections):
     # Apply the corrections
     def apply_corrections(genres_list):
       return [corrections.get(genre, genre) for genre in genres_list]
@@ -48,19 +56,80 @@ def correct_genres(df):
 
     return df
 
+CURRENT_CORRECTIONS = "SELECT genre, arg_max(correction, version) AS correction FROM meta.genre_corrections GROUP BY genre"
 
-def misspellings(db_file):
+def ensure_genre_corrections(conn):
+    """ Create meta.genre_corrections if needed, with the manual corrections as its first version.
+    """
+    conn.execute("CREATE SCHEMA IF NOT EXISTS meta")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta.genre_corrections (genre VARCHAR, correction VARCHAR, version INTEGER, created_at TIMESTAMP)")
+    if conn.execute("SELECT count(*) FROM meta.genre_corrections").fetchone()[0] == 0:
+        conn.executemany("INSERT INTO meta.genre_corrections VALUES (?, ?, 1, current_timestamp)", list(corrections.items()))
+
+def add_genre_corrections(db_file, new_corrections):
+    """ Store a dictionary of corrections (genre -> correction) as a new version of meta.genre_corrections.
+    Returns the version number.
+    """
+    conn = duckdb.connect(database=db_file, read_only=False)
+    ensure_genre_corrections(conn)
+    version = conn.execute("SELECT max(version) + 1 FROM meta.genre_corrections").fetchone()[0]
+    conn.executemany("INSERT INTO meta.genre_corrections VALUES (?, ?, ?, current_timestamp)",
+                     [(genre, correction, version) for genre, correction in new_corrections.items()])
+    conn.close()
+    return version
+
+def current_genre_corrections(conn):
+    """ Corrections in use (latest version of each genre) as a dictionary.
+    """
+    ensure_genre_corrections(conn)
+    return dict(conn.execute(CURRENT_CORRECTIONS).fetchall())
+
+def correct_genres_sql(conn, schema):
+    """ Apply meta.genre_corrections to the genres lists inside DuckDB in one set-based query: the lists are unnested,
+    joined with the corrections and aggregated back in their original order. The table is rebuilt in its original row
+    order (an UPDATE would move the updated rows to the end of the table).
+    """
+    ensure_genre_corrections(conn)
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {schema}.spotify AS
+        WITH exploded AS (
+            SELECT rowid AS row_id, unnest(genres) AS genre, generate_subscripts(genres, 1) AS position
+            FROM {schema}.spotify
+        ), corrected AS (
+            SELECT e.row_id, list(coalesce(c.correction, e.genre) ORDER BY e.position) AS genres
+            FROM exploded e LEFT JOIN ({CURRENT_CORRECTIONS}) c USING (genre)
+            GROUP BY e.row_id
+            HAVING bool_or(c.correction IS NOT NULL)
+        )
+        SELECT s.* REPLACE (coalesce(corrected.genres, s.genres) AS genres)
+        FROM {schema}.spotify s LEFT JOIN corrected ON s.rowid = corrected.row_id
+        ORDER BY s.rowid
+    """)
+
+def misspellings(db_file, schema='main', engine='pandas'):
+    """ Correct the genres of the spotify table of `schema` (e.g. 'staging' to only process a new batch).
+    `engine` is 'pandas' (corrections applied to a DataFrame) or 'sql' (see correct_genres_sql); both use the
+    corrections of meta.genre_corrections.
+    """
     conn = duckdb.connect(database=db_file, read_only=False)
-    df = conn.execute(f"SELECT * FROM {'spotify'}").df()
+    if not table_exists(conn, schema, 'spotify'):
+        conn.close()
+        return
+    if engine == 'sql':
+        correct_genres_sql(conn, schema)
+        conn.close()
+        return
+    df = conn.execute(f"SELECT * FROM {schema}.spotify").df()
 
     df = clean_and_split_genres(df)
-    df = correct_genres(df)
+    df = correct_genres(df, current_genre_corrections(conn))
 
-    conn.execute(f"DROP TABLE IF EXISTS {'spotify'}")
-    conn.execute(f"CREATE TABLE {'spotify'} AS SELECT * FROM df")
+    conn.execute(f"DROP TABLE IF EXISTS {schema}.spotify")
+    conn.execute(f"CREATE TABLE {schema}.spotify AS SELECT * FROM df")
 
     conn.close()
 
 if __name__ == "__main__":
     duckdb_file_path = input("Input DuckDB database (trusted): ")
-    misspellings(duckdb_file_path)   
\ No newline at end of file
+    engine = input("Engine (pandas or sql, leave empty for pandas): ").strip() or 'pandas'
+    misspellings(duckdb_file_path, engine=engine)   
\ No newline at end of file
@@ -0,0 +1,15 @@
+"""# Trusted tables
+Lookups of the tables of the trusted database shared by the trusted zone scripts (the data quality steps and the
+incremental trusted zone). Only the tables of the database of the connection are listed, not the ones of an attached
+database (e.g. the formatted database attached by incremental_trusted).
+"""
+
+def existing_tables(conn, schema='main'):
+    """ Tables of a schema of the database.
+    """
+    return {name for (name,) in conn.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE database_name = current_database() AND schema_name = ?", [schema]).fetchall()}
+
+def table_exists(conn, schema, table):
+    return conn.execute("SELECT count(*) FROM duckdb_tables() WHERE database_name = current_database() AND schema_name = ? AND table_name = ?",
+                        [schema, table]).fetchone()[0] > 0
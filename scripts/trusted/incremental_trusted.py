@@ -0,0 +1,129 @@
+import os
+import sys
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generic_data_quality'))
+from formatted2trusted import formatted_tables, record_trusted_snapshots, table_source_date, union_formatted_tables
+from deduplication import deduplication, publish_fingerprints
+from data_quality_rules import DATA_QUALITY_RULES, data_quality_rules
+from trusted_tables import existing_tables, table_exists
+
+"""# Incremental trusted zone
+Append to the trusted zone only the formatted snapshots that are not in it yet, instead of rebuilding the whole
+history (formatted2trusted followed by the data quality steps). The loaded snapshots are the formatted tables recorded
+in meta.trusted_snapshots, so a second snapshot of an already loaded day (e.g. 'spotify_11102024_v7') is appended too.
+
+1. The new snapshots are homogenized into a 'staging' schema of the trusted database.
+2. The data quality steps run on the staging tables only. The deduplication uses the fingerprint index of the
+   trusted tables (see deduplication.py), so rows already in the trusted zone (e.g. TicketMaster events with the same
+   values apart from source_date) are removed from the batch, like the deduplication of the full pipeline does.
+   The other rules (consistent formatting, misspellings) are then applied in one query per table
+   (see data_quality_rules.py).
+3. The staging tables are appended to the trusted tables (INSERT BY NAME), their fingerprints to the index and their
+   formatted tables to meta.trusted_snapshots in one transaction, and the staging schema is dropped. Without an index (trusted zone built before it existed), the
+   TicketMaster events already in the trusted table are filtered out here instead.
+"""
+
+def trusted_source_dates(con, table):
+    """ source_date values already in a trusted table (empty if the table does not exist yet).
+    """
+    if not table_exists(con, 'main', table):
+        return set()
+    return {date for (date,) in con.execute(f"SELECT DISTINCT source_date FROM main.{table}").fetchall()}
+
+def trusted_snapshots(con, table_names):
+    """ Formatted tables among `table_names` already loaded into the trusted tables. A trusted zone built before
+    meta.trusted_snapshots existed only has the source_date of its rows: the tables of a loaded date are recorded
+    as loaded then.
+    """
+    if not table_exists(con, 'meta', 'trusted_snapshots'):
+        for source in ['spotify', 'ticketmaster']:
+            loaded_dates = trusted_source_dates(con, source)
+            record_trusted_snapshots(con, source, [table_name for table_name in table_names
+                                                   if table_source_date(table_name)[0] == source and table_source_date(table_name)[1] in loaded_dates])
+    return {table_name for (table_name,) in con.execute("SELECT table_name FROM meta.trusted_snapshots").fetchall()}
+
+def stage_new_snapshots(formatted_db_file, trusted_db_file):
+    """ Homogenize the formatted snapshots not yet in the trusted tables into the staging schema.
+    Returns the names of the staged formatted tables.
+    """
+    con = duckdb.connect(database=trusted_db_file)
+    con.execute(f"ATTACH '{formatted_db_file}' AS formatted (READ_ONLY)")
+
+    table_names = [table_name for table_name in formatted_tables(con) if table_source_date(table_name)[0] in ['spotify', 'ticketmaster']]
+    loaded = trusted_snapshots(con, table_names)
+    new_tables = [table_name for table_name in table_names if table_name not in loaded]
+
+    con.execute("DROP SCHEMA IF EXISTS staging CASCADE")  # Leftovers of an interrupted run
+    if new_tables:
+        con.execute("CREATE SCHEMA staging")
+        union_formatted_tables(con, new_tables, schema='staging')
+
+    con.execute("DETACH formatted")
+    con.close()
+    return new_tables
+
+def publish_staging(trusted_db_file, new_tables):
+    """ Append the staging tables (built from the formatted tables `new_tables`) to the trusted tables, creating them
+    on the first run, and drop the staging schema.
+    """
+    con = duckdb.connect(database=trusted_db_file)
+    staged = existing_tables(con, 'staging')
+
+    con.execute("BEGIN TRANSACTION")
+    try:
+        for table in ['spotify', 'ticketmaster']:
+            if table not in staged:
+                continue
+            deduplicated_with_index = publish_fingerprints(con, 'staging', table)
+            if not table_exists(con, 'main', table):
+                con.execute(f"CREATE TABLE main.{table} AS SELECT * FROM staging.{table}")
+            elif table == 'ticketmaster' and not deduplicated_with_index:
+                # Events already in the trusted table (all the columns but source_date) bring no new information
+                columns = [column[0] for column in con.execute("DESCRIBE staging.ticketmaster").fetchall() if column[0] != 'source_date']
+                same_event = ' AND '.join(f'm."{column}" IS NOT DISTINCT FROM s."{column}"' for column in columns)
+                con.execute(f"""
+                    INSERT INTO main.ticketmaster BY NAME
+                    SELECT * FROM staging.ticketmaster s
+                    WHERE NOT EXISTS (SELECT 1 FROM main.ticketmaster m WHERE {same_event})
+                """)
+            else:
+                con.execute(f"INSERT INTO main.{table} BY NAME SELECT * FROM staging.{table}")
+            record_trusted_snapshots(con, table, [table_name for table_name in new_tables if table_source_date(table_name)[0] == table])
+            n_rows = con.execute(f"SELECT count(*) FROM main.{table}").fetchone()[0]
+            print(f"Table {table}: {n_rows} rows after the update")
+        con.execute("DROP SCHEMA staging CASCADE")
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def incremental_trusted(duckdb_file_path, trusted_dir):
+    """ Append the new formatted snapshots to the trusted zone, running the data quality steps on them only.
+    """
+    if not os.path.exists(trusted_dir):
+        os.makedirs(trusted_dir)
+    trusted_db_file = os.path.join(trusted_dir, 'trusted.duckdb')
+
+    new_tables = stage_new_snapshots(duckdb_file_path, trusted_db_file)
+    if not new_tables:
+        print("The trusted zone is up to date: no new snapshots.")
+        return
+    print(f"New snapshots: {', '.join(new_tables)}")
+
+    # Data quality steps on the new batch only
+    for message in deduplication(trusted_db_file, schema='staging', engine='index'):
+        print(message)
+    # The batch is already deduplicated against the index: only the other rules are left
+    rules = {table: [rule for rule in table_rules if rule['kind'] != 'deduplicate'] for table, table_rules in DATA_QUALITY_RULES.items()}
+    for message in data_quality_rules(trusted_db_file, schema='staging', rules=rules):
+        print(message)
+
+    publish_staging(trusted_db_file, new_tables)
+
+if __name__ == "__main__":
+    duckdb_file_path = input("Path to DuckDB file (input): ")
+    trustdir_out = input("Trusted directory path (output): ")
+    incremental_trusted(duckdb_file_path, trustdir_out)
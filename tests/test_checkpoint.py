@@ -0,0 +1,52 @@
+import contextlib
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'data_ingestion'))
+from checkpoint import IngestionCheckpoint
+
+"""Tests of the ingestion checkpoints: resuming a failed run, and never resuming the checkpoint of another run."""
+
+def open_checkpoint(checkpoint_dir, artist_names, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return IngestionCheckpoint(str(checkpoint_dir), 'spotify_data.json', artist_names, **kwargs)
+
+def finalize(checkpoint, output_path, artist_names):
+    with contextlib.redirect_stdout(io.StringIO()):
+        checkpoint.finalize(str(output_path), artist_names)
+    with open(output_path) as json_file:
+        return json.load(json_file)
+
+def failed_run(tmp_path, artist_names):
+    """ Run in which the first artist is fetched and the others fail: its checkpoint is kept.
+    """
+    checkpoint = open_checkpoint(tmp_path / 'checkpoints', artist_names)
+    checkpoint.write(artist_names[0], [{'artist': artist_names[0], 'followers': 1}])
+    with contextlib.redirect_stdout(io.StringIO()):
+        for artist_name in artist_names[1:]:
+            checkpoint.fail(artist_name, 'search failed')
+    finalize(checkpoint, tmp_path / 'spotify_data.json', artist_names)
+
+def test_failed_run_is_resumed(tmp_path):
+    failed_run(tmp_path, ['A', 'B'])
+    checkpoint = open_checkpoint(tmp_path / 'checkpoints', ['A', 'B'])
+    assert checkpoint.is_completed('A') and not checkpoint.is_completed('B')
+    checkpoint.write('B', [{'artist': 'B', 'followers': 2}])
+    assert finalize(checkpoint, tmp_path / 'spotify_data.json', ['A', 'B']) == [
+        {'artist': 'A', 'followers': 1}, {'artist': 'B', 'followers': 2}]
+    assert os.listdir(tmp_path / 'checkpoints') == []
+
+def test_stale_checkpoint_is_discarded(tmp_path):
+    failed_run(tmp_path, ['A', 'B'])
+
+    # Another artist list with the same output file name: the old records are not reused
+    checkpoint = open_checkpoint(tmp_path / 'checkpoints', ['A', 'C'])
+    assert not checkpoint.is_completed('A')
+    checkpoint.write('C', [{'artist': 'C', 'followers': 3}])
+    assert finalize(checkpoint, tmp_path / 'spotify_data.json', ['A', 'C']) == [{'artist': 'C', 'followers': 3}]
+
+    # Same artist list, but a checkpoint older than max_age
+    failed_run(tmp_path, ['A', 'B'])
+    assert not open_checkpoint(tmp_path / 'checkpoints', ['A', 'B'], max_age=-1).is_completed('A')
@@ -0,0 +1,76 @@
+import os
+import sys
+import duckdb
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'trusted', 'generic_data_quality'))
+from consistent_formatting import consistent_formatting
+from data_quality_rules import data_quality_rules
+from deduplication import deduplication
+from misspellings import misspellings
+
+"""Tests of the data quality rules against the pandas data quality steps, on formatted tables as landing2formatted
+writes them (date and time as VARCHAR)."""
+
+TICKETMASTER = [
+    # artist, name, date, time, venue, location, price_range, source_date
+    ('A', 'Show 1', '2024-12-15', '19:00:00', 'Hall', 'Madrid, Spain', '10.0-20.0 EUR', '11102024'),
+    ('A', 'Show 1', '2024-12-15', '19:00:00', 'Hall', 'Madrid, Spain', '10.0-20.0 EUR', '19102024'),
+    ('A', 'Show 2', '2040-01-01', 'N/A', 'N/A', 'N/A, N/A', 'N/A-N/A USD', '11102024'),
+    ('B', 'Show 3', '2999-01-10', '21:30:00', 'Club', 'New York, NY, United States', '54.99-379.99 USD', '11102024'),
+    ('B', 'Show 4', 'N/A', '20:00:00', 'Venue', 'Nowhere', '5.0-6.0 XXX', '11102024'),
+]
+
+SPOTIFY = [
+    # artist, genres, followers, popularity, source_date
+    ('A', ['dance-pop', 'pop'], 10, 50, '11102024'),
+    ('A', ['dance-pop', 'pop'], 10, 50, '11102024'),
+    ('B', [], 5, 20, '11102024'),
+    ('C', ['hiphop', 'rap', 'alt hip-hop'], 7, 30, '19102024'),
+]
+
+def build_trusted(db_file):
+    con = duckdb.connect(database=db_file)
+    con.execute("""CREATE TABLE ticketmaster (artist VARCHAR, name VARCHAR, date VARCHAR, time VARCHAR, venue VARCHAR,
+                                              location VARCHAR, price_range VARCHAR, source_date VARCHAR)""")
+    con.executemany("INSERT INTO ticketmaster VALUES (?, ?, ?, ?, ?, ?, ?, ?)", TICKETMASTER)
+    con.execute("CREATE TABLE spotify (artist VARCHAR, genres VARCHAR[], followers BIGINT, popularity BIGINT, source_date VARCHAR)")
+    con.executemany("INSERT INTO spotify VALUES (?, ?, ?, ?, ?)", SPOTIFY)
+    con.close()
+
+def read_tables(db_file):
+    con = duckdb.connect(database=db_file, read_only=True)
+    tables = {table: (con.execute(f"DESCRIBE {table}").fetchall(), con.execute(f"SELECT * FROM {table}").fetchall())
+              for table in ['ticketmaster', 'spotify']}
+    con.close()
+    return tables
+
+@pytest.fixture
+def pandas_result(tmp_path):
+    db_file = str(tmp_path / 'pandas.duckdb')
+    build_trusted(db_file)
+    deduplication(db_file)
+    consistent_formatting(db_file)
+    misspellings(db_file)
+    return read_tables(db_file)
+
+@pytest.mark.parametrize('profile', [False, True])
+def test_rules_match_pandas_steps(tmp_path, pandas_result, profile):
+    db_file = str(tmp_path / 'rules.duckdb')
+    build_trusted(db_file)
+    data_quality_rules(db_file, profile=profile)
+    assert read_tables(db_file) == pandas_result
+
+def test_rules_parse_varchar_dates(tmp_path):
+    db_file = str(tmp_path / 'rules.duckdb')
+    build_trusted(db_file)
+    data_quality_rules(db_file)
+
+    con = duckdb.connect(database=db_file, read_only=True)
+    types = dict(con.execute("SELECT column_name, column_type FROM (DESCRIBE ticketmaster)").fetchall())
+    dates = con.execute("SELECT name, date, time FROM ticketmaster ORDER BY name").fetchall()
+    con.close()
+    assert types['date'] == types['time'] == 'TIMESTAMP_NS'
+    # Beyond the cut-off, out of the nanosecond range or unparsable: NULL
+    assert [(name, date is None, time is None) for name, date, time in dates] == [
+        ('Show 1', False, False), ('Show 2', True, True), ('Show 3', True, False), ('Show 4', True, False)]
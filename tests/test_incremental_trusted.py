@@ -0,0 +1,98 @@
+import contextlib
+import io
+import os
+import sys
+import duckdb
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'trusted'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'trusted', 'generic_data_quality'))
+from deduplication import deduplication
+from formatted2trusted import formatted2trusted
+from incremental_trusted import incremental_trusted
+
+"""Tests of the incremental trusted zone on small formatted zones (tables as landing2formatted writes them)."""
+
+EVENT_1 = ('A', 'Show 1', '2024-12-15', '19:00:00', 'Hall', 'Madrid, Spain', '10.0-20.0 EUR')
+EVENT_2 = ('B', 'Show 2', '2025-01-04', '21:00:00', 'Club', 'Paris, France', '15.0-15.0 USD')
+
+def write_formatted(db_file, snapshots):
+    """ Formatted database with the `snapshots` ({date: (events, artists)}) of both sources.
+    """
+    con = duckdb.connect(database=db_file)
+    for table, (events, artists) in snapshots.items():
+        con.execute(f"""CREATE TABLE ticketmaster_{table} (artist VARCHAR, name VARCHAR, date VARCHAR, time VARCHAR,
+                                                           venue VARCHAR, location VARCHAR, price_range VARCHAR)""")
+        con.executemany(f"INSERT INTO ticketmaster_{table} VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+        con.execute(f"CREATE TABLE spotify_{table} (artist VARCHAR, genres VARCHAR[], followers BIGINT, popularity BIGINT)")
+        con.executemany(f"INSERT INTO spotify_{table} VALUES (?, ?, ?, ?)", artists)
+    con.close()
+
+def run_quietly(function, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+def count_rows(db_file, table):
+    con = duckdb.connect(database=db_file, read_only=True)
+    n_rows = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    con.close()
+    return n_rows
+
+def test_index_rebuilt_after_formatting_is_not_trusted(tmp_path):
+    first = str(tmp_path / 'first.duckdb')
+    both = str(tmp_path / 'both.duckdb')
+    write_formatted(first, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)])})
+    write_formatted(both, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)]),
+                           '19102024': ([EVENT_1, EVENT_2], [('A', ['pop'], 2, 2)])})
+    trusted_dir = str(tmp_path / 'trusted')
+    trusted_db_file = os.path.join(trusted_dir, 'trusted.duckdb')
+
+    run_quietly(incremental_trusted, first, trusted_dir)
+    # The index is rebuilt from the formatted trusted table: its key columns no longer match a raw batch
+    run_quietly(deduplication, trusted_db_file, engine='index')
+    run_quietly(incremental_trusted, both, trusted_dir)
+
+    # EVENT_1 of the second snapshot is already in the trusted zone
+    assert count_rows(trusted_db_file, 'ticketmaster') == 2
+    assert count_rows(trusted_db_file, 'spotify') == 2
+
+def test_second_snapshot_of_a_loaded_day_is_appended(tmp_path):
+    first = str(tmp_path / 'first.duckdb')
+    both = str(tmp_path / 'both.duckdb')
+    write_formatted(first, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)])})
+    write_formatted(both, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)]),
+                           '11102024_v3': ([EVENT_2], [('B', ['rock'], 2, 2)])})
+    trusted_dir = str(tmp_path / 'trusted')
+    trusted_db_file = os.path.join(trusted_dir, 'trusted.duckdb')
+
+    run_quietly(incremental_trusted, first, trusted_dir)
+    run_quietly(incremental_trusted, both, trusted_dir)
+    assert count_rows(trusted_db_file, 'ticketmaster') == 2
+    assert count_rows(trusted_db_file, 'spotify') == 2
+
+    # Nothing new: the trusted zone is left as it is
+    run_quietly(incremental_trusted, both, trusted_dir)
+    assert count_rows(trusted_db_file, 'spotify') == 2
+
+def test_same_day_versions_keep_the_first_snapshot(tmp_path):
+    # Spotify keeps one row per artist and source_date: the version suffix is not part of the date
+    formatted = str(tmp_path / 'formatted.duckdb')
+    write_formatted(formatted, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)]),
+                                '11102024_v3': ([EVENT_1, EVENT_2], [('A', ['pop'], 2, 2), ('B', ['rock'], 3, 3)])})
+
+    full_dir = str(tmp_path / 'full')
+    run_quietly(formatted2trusted, formatted, full_dir, engine='sql')
+    run_quietly(deduplication, os.path.join(full_dir, 'trusted.duckdb'))
+
+    first = str(tmp_path / 'first.duckdb')
+    write_formatted(first, {'11102024': ([EVENT_1], [('A', ['pop'], 1, 1)])})
+    incremental_dir = str(tmp_path / 'incremental')
+    run_quietly(incremental_trusted, first, incremental_dir)
+    run_quietly(incremental_trusted, formatted, incremental_dir)
+
+    for trusted_dir in [full_dir, incremental_dir]:
+        con = duckdb.connect(database=os.path.join(trusted_dir, 'trusted.duckdb'), read_only=True)
+        spotify = con.execute("SELECT artist, followers, source_date FROM spotify ORDER BY artist").fetchall()
+        n_events = con.execute("SELECT count(*) FROM ticketmaster").fetchone()[0]
+        con.close()
+        assert spotify == [('A', 1, '11102024'), ('B', 3, '11102024')]
+        assert n_events == 2
@@ -0,0 +1,43 @@
+import os
+import sys
+import duckdb
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'trusted', 'generic_data_quality'))
+from misspellings import misspellings
+
+"""Tests of the genre corrections engines on a small trusted spotify table."""
+
+SPOTIFY = [
+    # artist, genres, followers, popularity, source_date
+    ('A', ['hiphop', 'rap'], 10, 50, '11102024'),
+    ('B', [], 5, 20, '11102024'),
+    ('C', ['pop'], 7, 30, '11102024'),
+    ('D', ['alt hip-hop', 'hiphop'], 3, 10, '19102024'),
+]
+
+@pytest.fixture
+def spotify_db(tmp_path):
+    def build(name):
+        db_file = str(tmp_path / name)
+        con = duckdb.connect(database=db_file)
+        con.execute("CREATE TABLE spotify (artist VARCHAR, genres VARCHAR[], followers BIGINT, popularity BIGINT, source_date VARCHAR)")
+        con.executemany("INSERT INTO spotify VALUES (?, ?, ?, ?, ?)", SPOTIFY)
+        con.close()
+        return db_file
+    return build
+
+def read_spotify(db_file):
+    con = duckdb.connect(database=db_file, read_only=True)
+    rows = con.execute("SELECT * FROM spotify").fetchall()
+    con.close()
+    return rows
+
+def test_sql_engine_matches_pandas_and_keeps_row_order(spotify_db):
+    pandas_db, sql_db = spotify_db('pandas.duckdb'), spotify_db('sql.duckdb')
+    misspellings(pandas_db)
+    misspellings(sql_db, engine='sql')
+    rows = read_spotify(sql_db)
+    assert rows == read_spotify(pandas_db)
+    assert [artist for artist, *_ in rows] == ['A', 'B', 'C', 'D']
+    assert rows[0][1] == ['hip hop', 'rap']